@@ -5,12 +5,19 @@ import os
 import json
 import threading
 import queue
-from pathlib import Path
 import platform
-import re
+import sqlite3
 import sys
-from typing import List, Dict, Tuple
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple, Optional
+
+from mp3_core import (ERROR_CLASSES, MIN_FFMPEG_VERSION, TOOLS, FileList, FileRow,
+                      JobJournal, MP3Processor, ProbeCache, ProbeIndex, ProbeInfo,
+                      ProcessingOptions, RunTimings, ScanFilter, SilenceCache, SizePlanner,
+                      common_directory,
+                      content_identity, default_worker_count, iter_sources,
+                      summarize_results)
 
 # Intentar importar tkinterDnD para drag and drop
 try:
@@ -21,6 +28,149 @@ except ImportError:
     print("tkinterDnD no está instalado. Drag and drop no disponible.")
     print("Instálalo con: pip install tkinterdnd2")
 
+# Importación en segundo plano: filas por grupo y frecuencia de envío a Tk
+IMPORT_CHUNK_SIZE = 200
+IMPORT_FLUSH_INTERVAL = 0.25
+
+# Vista previa de tamaños: espera tras el último cambio (ms)
+PREVIEW_DELAY_MS = 150
+
+# Espera antes de reconstruir el orden de la lista tras recibir filas (ms)
+LIST_REFRESH_DELAY_MS = 100
+
+
+class VirtualFileList:
+    """Lista virtual sobre un ``ttk.Treeview``
+    
+    El Treeview solo contiene tantas filas como caben en pantalla; al
+    desplazarse se vuelven a rellenar con las filas del modelo
+    (``FileList``) que corresponden. Así añadir, ordenar o vaciar la lista
+    no depende del número de archivos en el lado de Tk.
+    """
+    
+    def __init__(self, parent, model: FileList, columns: Tuple[Tuple[str, str, int], ...],
+                 format_row: Callable[[FileRow], Tuple]):
+        self.model = model
+        self.format_row = format_row
+        self.view: List[FileRow] = []
+        self.offset = 0
+        self.visible_rows = 8
+        self.sort_column: Optional[str] = None
+        self.sort_reverse = False
+        self.headings = {name: text for name, text, _ in columns}
+        self._render_pending = False
+        
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[name for name, _, _ in columns],
+                                 show='headings', height=self.visible_rows)
+        for name, text, width in columns:
+            self.tree.heading(name, text=text, command=lambda name=name: self.sort_by(name))
+            self.tree.column(name, width=width, minwidth=60)
+        self.items = [self.tree.insert('', 'end') for _ in range(self.visible_rows)]
+        
+        # La barra vertical recorre el modelo, no el Treeview
+        self.vsb = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        hsb = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+        
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.vsb.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        hsb.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Prior>', lambda event: self.scroll(-self.visible_rows))
+        self.tree.bind('<Next>', lambda event: self.scroll(self.visible_rows))
+    
+    def refresh(self):
+        """Reconstruir el orden visible a partir del modelo"""
+        if self.sort_column:
+            self.view = self.model.sorted_rows(self.sort_column, self.sort_reverse)
+        else:
+            self.view = self.model.rows()
+        self.render()
+    
+    def sort_by(self, column: str):
+        """Ordenar por una columna (un segundo clic invierte el orden)"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        
+        for name, text in self.headings.items():
+            arrow = (" ▼" if self.sort_reverse else " ▲") if name == column else ""
+            self.tree.heading(name, text=text + arrow)
+        self.offset = 0
+        self.refresh()
+    
+    def request_render(self):
+        """Repintar las filas visibles en el próximo ciclo de Tk"""
+        if not self._render_pending:
+            self._render_pending = True
+            self.tree.after_idle(self.render)
+    
+    def render(self):
+        """Rellenar las filas del Treeview con la ventana visible del modelo"""
+        self._render_pending = False
+        total = len(self.view)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        
+        for position, item in enumerate(self.items):
+            index = self.offset + position
+            if index < total:
+                self.tree.item(item, values=self.format_row(self.view[index]))
+                self.tree.move(item, '', position)
+            else:
+                self.tree.detach(item)
+        
+        if total > self.visible_rows:
+            self.vsb.set(self.offset / total, (self.offset + self.visible_rows) / total)
+        else:
+            self.vsb.set(0.0, 1.0)
+    
+    def scroll(self, rows: int):
+        self.offset += rows
+        self.render()
+        return "break"
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        """Órdenes de la barra de desplazamiento (moveto / scroll)"""
+        if action == 'moveto':
+            self.offset = int(float(amount) * len(self.view))
+            self.render()
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self.scroll(int(amount) * step)
+    
+    def on_mousewheel(self, event):
+        # Windows usa múltiplos de 120; macOS, valores pequeños
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll(-delta * 3)
+    
+    def on_resize(self, event):
+        """Ajustar el número de filas reales al alto disponible"""
+        style = ttk.Style()
+        try:
+            row_height = int(style.lookup('Treeview', 'rowheight') or 20)
+        except (ValueError, tk.TclError):
+            row_height = 20
+        rows = max(1, (event.height - 24) // row_height)
+        if rows == self.visible_rows:
+            return
+        
+        while len(self.items) < rows:
+            self.items.append(self.tree.insert('', 'end'))
+        while len(self.items) > rows:
+            self.tree.delete(self.items.pop())
+        self.visible_rows = rows
+        self.render()
+
+
 class MP3Editor:
     def __init__(self, root):
         self.root = root
@@ -42,15 +192,53 @@ class MP3Editor:
             pass
         
         # Variables
-        self.current_files = []  # Lista de archivos a procesar
+        self.current_files = FileList()  # Archivos a procesar, en orden y sin duplicados
         self.processing = False
         self.output_queue = queue.Queue()
+        
+        # Importación de archivos en segundo plano
+        self.importing = False
+        self.import_requests = queue.Queue()
+        self.import_cancel = threading.Event()
+        self.import_added = 0
+        self.list_refresh_job = None
         self.output_folder = tk.StringVar(value="")  # Carpeta de salida personalizada
         self.name_pattern = tk.StringVar(value="{filename}_editado")  # Patrón de nombre
         
         # Cargar configuración guardada
         self.config_file = "mp3_editor_config.json"
-        self.last_bitrate = self.load_config()
+        self.config = self.load_config()
+        TOOLS.configure(ffmpeg=self.config['ffmpeg_path'], ffprobe=self.config['ffprobe_path'])
+        self.last_bitrate = self.config['last_bitrate']
+        self.max_workers_var = tk.StringVar(value=str(self.config['max_workers']))
+        self.content_dedup_var = tk.BooleanVar(value=self.config['content_dedup'])
+        self.stream_copy_var = tk.BooleanVar(value=self.config['stream_copy'])
+        self.skip_unchanged_var = tk.BooleanVar(value=self.config['skip_unchanged'])
+        
+        # Metadatos compartidos (una inspección por archivo), persistidos
+        # en un índice junto al archivo de configuración
+        self.index_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)),
+                                       "mp3_editor_index.db")
+        self.probe_cache = ProbeCache(self.open_probe_index())
+        
+        # Silencios ya codificados, reutilizados entre archivos y sesiones
+        self.silence_cache = SilenceCache(
+            os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "mp3_editor_cache", "silence"),
+            int(self.config['silence_cache_mb']) * 1024 * 1024)
+        
+        # Estimación de tamaños de toda la lista (columna "Tamaño final")
+        self.planner = SizePlanner()
+        self.preview_job = None
+        
+        # Registro de trabajos para poder reanudar lotes interrumpidos
+        self.journal = self.open_job_journal()
+        
+        # Tiempos por etapa del último lote (histograma e informe exportable)
+        self.last_timings: Optional[RunTimings] = None
+        
+        # Núcleo de procesamiento (compartido con la línea de comandos)
+        self.processor = MP3Processor(self.probe_cache, self.silence_cache,
+                                      lambda kind, message: self.output_queue.put((kind, message)))
         
         # Configurar estilo
         self.setup_styles()
@@ -81,27 +269,74 @@ class MP3Editor:
         
     def load_config(self):
         """Cargar configuración guardada"""
-        default_bitrate = "Mantener bitrate original"
+        config = {
+            'last_bitrate': "Mantener bitrate original",
+            'max_workers': default_worker_count(),
+            'index_max_entries': 100000,
+            'content_dedup': False,
+            'stream_copy': True,
+            'silence_cache_mb': 256,
+            'scratch_dir': "",
+            'fsync_outputs': False,
+            'skip_unchanged': False,
+            # Añadir silencio empalmando tramas en Python (sin FFmpeg) cuando se puede
+            'native_splice': True,
+            # Filtros al añadir carpetas (patrones glob, tamaños en KB, -1 = sin límite)
+            'scan_include': [],
+            'scan_exclude': [],
+            'scan_min_kb': 0,
+            'scan_max_kb': 0,
+            'scan_max_depth': -1,
+            'scan_follow_symlinks': False,
+            # Rutas de ffmpeg/ffprobe (vacío = buscar junto a la aplicación y en el PATH)
+            'ffmpeg_path': "",
+            'ffprobe_path': ""
+        }
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    return config.get('last_bitrate', default_bitrate)
+                    config.update(json.load(f))
         except:
             pass
-        return default_bitrate
+        return config
     
     def save_config(self):
         """Guardar configuración"""
         try:
-            config = {
-                'last_bitrate': self.bitrate_var.get()
-            }
+            self.config['last_bitrate'] = self.bitrate_var.get()
+            self.config['max_workers'] = self.get_max_workers()
+            self.config['content_dedup'] = self.content_dedup_var.get()
+            self.config['stream_copy'] = self.stream_copy_var.get()
+            self.config['skip_unchanged'] = self.skip_unchanged_var.get()
             with open(self.config_file, 'w') as f:
-                json.dump(config, f)
+                json.dump(self.config, f)
         except:
             pass
     
+    def open_job_journal(self) -> Optional[JobJournal]:
+        """Abrir el registro persistente de trabajos"""
+        try:
+            return JobJournal(os.path.join(os.path.dirname(os.path.abspath(self.config_file)),
+                                           "mp3_editor_journal.db"))
+        except sqlite3.Error as e:
+            print(f"Registro de trabajos no disponible: {e}")
+            return None
+    
+    def open_probe_index(self) -> Optional[ProbeIndex]:
+        """Abrir el índice persistente de metadatos"""
+        try:
+            return ProbeIndex(self.index_file, int(self.config['index_max_entries']))
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Índice de metadatos no disponible: {e}")
+            return None
+    
+    def get_max_workers(self) -> int:
+        """Obtener el número de trabajos simultáneos configurado"""
+        try:
+            return max(1, int(self.max_workers_var.get()))
+        except (ValueError, tk.TclError):
+            return default_worker_count()
+    
     def setup_drag_drop(self):
         """Configurar funcionalidad de arrastrar y soltar usando tkinterDnD"""
         if not TKINTERDND_AVAILABLE:
@@ -173,52 +408,24 @@ class MP3Editor:
         if not files:
             return
         
-        added_count = 0
-        for file_path in files:
-            # Limpiar la ruta del archivo
-            file_path = file_path.strip()
-            # Verificar si el archivo existe y es MP3
-            if os.path.exists(file_path) and file_path.lower().endswith('.mp3'):
-                if file_path not in self.current_files:
-                    self.current_files.append(file_path)
-                    self.add_file_to_tree(file_path)
-                    added_count += 1
-            elif os.path.exists(file_path) and os.path.isdir(file_path):
-                # Si es una carpeta, buscar archivos MP3 dentro
-                for root_dir, _, filenames in os.walk(file_path):
-                    for filename in filenames:
-                        if filename.lower().endswith('.mp3'):
-                            full_path = os.path.join(root_dir, filename)
-                            if full_path not in self.current_files:
-                                self.current_files.append(full_path)
-                                self.add_file_to_tree(full_path)
-                                added_count += 1
-        
-        if added_count > 0:
-            self.update_file_count()
-            self.update_status(f"✓ Añadidos {added_count} archivos por arrastre")
-        else:
-            messagebox.showwarning("Advertencia", "No se encontraron archivos MP3 válidos en los archivos arrastrados.")
+        # Limpiar las rutas; el análisis se hace en segundo plano
+        self.start_import([file_path.strip() for file_path in files if file_path.strip()])
     
     def check_ffmpeg(self):
-        """Verificar si FFmpeg está instalado"""
-        try:
-            if os.path.exists("ffmpeg.exe"):
-                self.log("✓ FFmpeg encontrado en directorio actual")
-                return True
-            
-            # Verificar en PATH del sistema
-            result = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                self.log("✓ FFmpeg encontrado en sistema")
-                return True
-            else:
-                self.show_warning("FFmpeg no encontrado. Algunas funciones pueden no estar disponibles.\n\nPuedes descargarlo de https://ffmpeg.org/ y colocarlo en la misma carpeta que esta aplicación.")
-                return False
-        except Exception as e:
-            self.show_warning(f"FFmpeg no encontrado: {e}\n\nPor favor, instala FFmpeg para usar todas las funciones.")
+        """Verificar si FFmpeg está instalado y admite MP3"""
+        ffmpeg = TOOLS.find('ffmpeg')
+        if not ffmpeg.available:
+            self.show_warning("FFmpeg no encontrado. Algunas funciones pueden no estar disponibles (añadir silencio manteniendo el bitrate original sí funciona).\n\nPuedes descargarlo de https://ffmpeg.org/ y colocarlo en la misma carpeta que esta aplicación.")
+            return False
+        if not ffmpeg.has_libmp3lame:
+            self.show_warning(f"FFmpeg ({ffmpeg.path}) no incluye el codificador libmp3lame.\n\nInstala una versión de FFmpeg con soporte para MP3.")
+            return False
+        if not ffmpeg.supported:
+            minimum = '.'.join(map(str, MIN_FFMPEG_VERSION))
+            self.show_warning(f"FFmpeg {ffmpeg.version} es demasiado antiguo; se necesita la versión {minimum} o posterior.")
             return False
+        self.log(f"✓ FFmpeg {ffmpeg.version} encontrado en {ffmpeg.path}")
+        return True
     
     def create_widgets(self):
         """Crear todos los widgets de la interfaz"""
@@ -251,11 +458,21 @@ class MP3Editor:
         # Sección: Botones principales
         self.create_buttons_section(main_frame, row=5)
         
+        # Barra de progreso del lote
+        self.progress_var = tk.DoubleVar(value=0.0)
+        self.progress_bar = ttk.Progressbar(main_frame, variable=self.progress_var,
+                                            maximum=100.0, mode='determinate')
+        self.progress_bar.grid(row=6, column=0, columnspan=4, 
+                              sticky=(tk.W, tk.E), pady=(10, 0))
+        
         # Barra de estado
         self.status_label = ttk.Label(main_frame, text="Listo", relief=tk.SUNKEN, 
                                      anchor=tk.W, padding=(5, 2))
-        self.status_label.grid(row=6, column=0, columnspan=4, 
-                              sticky=(tk.W, tk.E), pady=(10, 0))
+        self.status_label.grid(row=7, column=0, columnspan=4, 
+                              sticky=(tk.W, tk.E), pady=(5, 0))
+        
+        # Recalcular la columna "Tamaño final" al cambiar la configuración
+        self.bind_size_preview()
     
     def create_files_selection_section(self, parent, row):
         """Crear sección para seleccionar múltiples archivos"""
@@ -273,47 +490,45 @@ class MP3Editor:
                   command=self.add_folder).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(btn_frame, text="Limpiar Lista", 
                   command=self.clear_files).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(btn_frame, text="Reconstruir Índice", 
+                  command=self.rebuild_index).pack(side=tk.LEFT, padx=(0, 5))
+        
+        ttk.Checkbutton(btn_frame, text="Detectar duplicados por contenido",
+                       variable=self.content_dedup_var).pack(side=tk.LEFT, padx=(10, 0))
         
         # Contador de archivos
         self.file_count_label = ttk.Label(files_frame, text="0 archivos seleccionados")
         self.file_count_label.grid(row=0, column=1, sticky=tk.E, pady=(0, 10))
         
-        # Crear un frame para el treeview y scrollbars
-        self.tree_frame = ttk.Frame(files_frame)
+        # Progreso de la importación en segundo plano
+        self.import_frame = ttk.Frame(files_frame)
+        self.import_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        
+        self.import_label = ttk.Label(self.import_frame, text="")
+        self.import_label.pack(side=tk.LEFT)
+        ttk.Button(self.import_frame, text="Cancelar Importación",
+                  command=self.cancel_import).pack(side=tk.LEFT, padx=(10, 0))
+        self.import_frame.grid_remove()
+        
+        # Totales estimados con la configuración actual
+        self.estimate_label = ttk.Label(files_frame, text="", style='Info.TLabel')
+        self.estimate_label.grid(row=3, column=0, columnspan=2, sticky=tk.W)
+        
+        # Lista virtual: solo se dibujan las filas visibles
+        columns = (
+            ('filename', 'Nombre del Archivo', 200),
+            ('size', 'Tamaño', 80),
+            ('estimated', 'Tamaño final', 90),
+            ('duration', 'Duración', 80),
+            ('bitrate', 'Bitrate', 80),
+            ('status', 'Estado', 90),
+            ('path', 'Ruta', 250),
+        )
+        self.file_view = VirtualFileList(files_frame, self.current_files, columns, self.format_file_row)
+        self.tree_frame = self.file_view.frame
+        self.files_tree = self.file_view.tree
         self.tree_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 5))
         
-        # Treeview para lista de archivos
-        columns = ('filename', 'size', 'duration', 'bitrate', 'path')
-        self.files_tree = ttk.Treeview(self.tree_frame, columns=columns, 
-                                      show='headings', height=8)
-        
-        # Configurar columnas
-        self.files_tree.heading('filename', text='Nombre del Archivo')
-        self.files_tree.heading('size', text='Tamaño')
-        self.files_tree.heading('duration', text='Duración')
-        self.files_tree.heading('bitrate', text='Bitrate')
-        self.files_tree.heading('path', text='Ruta')
-        
-        self.files_tree.column('filename', width=200, minwidth=150)
-        self.files_tree.column('size', width=80, minwidth=60)
-        self.files_tree.column('duration', width=80, minwidth=60)
-        self.files_tree.column('bitrate', width=80, minwidth=60)
-        self.files_tree.column('path', width=250, minwidth=150)
-        
-        # Scrollbars
-        vsb = ttk.Scrollbar(self.tree_frame, orient=tk.VERTICAL, command=self.files_tree.yview)
-        hsb = ttk.Scrollbar(self.tree_frame, orient=tk.HORIZONTAL, command=self.files_tree.xview)
-        self.files_tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        # Grid del treeview y scrollbars
-        self.files_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        vsb.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        hsb.grid(row=1, column=0, sticky=(tk.W, tk.E))
-        
-        # Configurar el grid del tree_frame
-        self.tree_frame.columnconfigure(0, weight=1)
-        self.tree_frame.rowconfigure(0, weight=1)
-        
         files_frame.rowconfigure(1, weight=1)
         files_frame.columnconfigure(0, weight=1)
         
@@ -326,7 +541,7 @@ class MP3Editor:
         self.drag_label = ttk.Label(files_frame, 
                                    text=drag_text, 
                                    font=('Arial', 9, 'italic'), foreground='blue')
-        self.drag_label.grid(row=3, column=0, columnspan=3, pady=(5, 0))
+        self.drag_label.grid(row=4, column=0, columnspan=3, pady=(5, 0))
     
     def create_output_section(self, parent, row):
         """Crear sección para configuración de salida"""
@@ -364,6 +579,18 @@ class MP3Editor:
         ttk.Checkbutton(output_frame, text="Mantener estructura de carpetas",
                        variable=self.preserve_folder_var).grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
         
+        ttk.Checkbutton(output_frame, text="Omitir archivos sin cambios desde la última ejecución",
+                       variable=self.skip_unchanged_var).grid(row=4, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        # Trabajos simultáneos de FFmpeg
+        workers_frame = ttk.Frame(output_frame)
+        workers_frame.grid(row=5, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        ttk.Label(workers_frame, text="Trabajos simultáneos:").pack(side=tk.LEFT)
+        ttk.Spinbox(workers_frame, from_=1, to=max(64, default_worker_count()), width=5,
+                    increment=1, textvariable=self.max_workers_var).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(workers_frame, text=f"(núcleos disponibles: {default_worker_count()})").pack(side=tk.LEFT, padx=(5, 0))
+        
         output_frame.columnconfigure(1, weight=1)
     
     def create_bitrate_section(self, parent, row):
@@ -424,6 +651,23 @@ class MP3Editor:
                        variable=self.preserve_meta).grid(row=2, column=0, 
                                                        columnspan=4, sticky=tk.W, pady=(10, 0))
         
+        # Copia directa de las tramas cuando no hace falta recodificar
+        ttk.Checkbutton(bitrate_frame, text="Copiar el audio sin recodificar cuando se mantiene el bitrate original",
+                       variable=self.stream_copy_var).grid(row=3, column=0, 
+                                                       columnspan=4, sticky=tk.W, pady=(5, 0))
+        
+        # Tamaño exacto: el bitrate se calcula para alcanzarlo al byte
+        target_frame = ttk.Frame(bitrate_frame)
+        target_frame.grid(row=4, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        
+        ttk.Label(target_frame, text="Tamaño exacto (MB):").pack(side=tk.LEFT)
+        self.target_size_var = tk.StringVar(value="")
+        ttk.Entry(target_frame, textvariable=self.target_size_var, width=10).pack(side=tk.LEFT, padx=(5, 0))
+        self.target_scope_var = tk.StringVar(value="por archivo")
+        ttk.Combobox(target_frame, textvariable=self.target_scope_var, state="readonly", width=14,
+                     values=["por archivo", "total del lote"]).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(target_frame, text="(vacío = usar el bitrate elegido)").pack(side=tk.LEFT, padx=(5, 0))
+        
         self.bitrate_combo.bind('<<ComboboxSelected>>', self.on_bitrate_change)
     
     def set_bitrate_selection(self):
@@ -511,9 +755,17 @@ class MP3Editor:
                   style='Accent.TButton', width=15)
         self.process_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.cancel_btn = ttk.Button(button_frame, text="Cancelar", 
+                  command=self.cancel_processing, state='disabled', width=10)
+        self.cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(button_frame, text="Calcular Tamaños", 
                   command=self.calculate_all_sizes, width=15).pack(side=tk.LEFT, padx=(0, 10))
         
+        self.timings_btn = ttk.Button(button_frame, text="Ver Tiempos", 
+                  command=self.show_timings, state='disabled', width=12)
+        self.timings_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(button_frame, text="Abrir Carpeta Salida", 
                   command=self.open_output_folder, width=15).pack(side=tk.LEFT, padx=(0, 10))
         
@@ -530,93 +782,278 @@ class MP3Editor:
         )
         
         if filenames:
-            for filename in filenames:
-                if filename not in self.current_files:
-                    self.current_files.append(filename)
-                    self.add_file_to_tree(filename)
-            
-            self.update_file_count()
-            self.update_status(f"✓ Añadidos {len(filenames)} archivos")
+            self.start_import(list(filenames))
     
     def add_folder(self):
         """Añadir todos los archivos MP3 de una carpeta"""
         folder = filedialog.askdirectory(title="Seleccionar carpeta con archivos MP3")
         
         if folder:
-            mp3_files = []
-            for ext in ['*.mp3', '*.MP3']:
-                mp3_files.extend(Path(folder).rglob(ext))
-            
-            added_count = 0
-            for mp3_file in mp3_files:
-                filename = str(mp3_file)
-                if filename not in self.current_files:
-                    self.current_files.append(filename)
-                    self.add_file_to_tree(filename)
-                    added_count += 1
-            
-            self.update_file_count()
-            self.update_status(f"✓ Añadidos {added_count} archivos de la carpeta")
+            self.start_import([folder])
     
     def clear_files(self):
         """Limpiar lista de archivos"""
         if self.current_files:
             if messagebox.askyesno("Confirmar", "¿Estás seguro de que quieres limpiar la lista de archivos?"):
+                self.cancel_import()
                 self.current_files.clear()
-                for item in self.files_tree.get_children():
-                    self.files_tree.delete(item)
+                self.planner.clear()
+                self.probe_cache.clear()
+                self.file_view.refresh()
                 self.update_file_count()
                 self.update_status("✓ Lista de archivos limpiada")
     
-    def add_file_to_tree(self, filename):
-        """Añadir archivo al Treeview con información básica"""
+    def rebuild_index(self):
+        """Descartar el índice de metadatos y volver a inspeccionar la lista"""
+        if self.importing:
+            messagebox.showwarning("Advertencia", "Espera a que termine la importación en curso.")
+            return
+        
+        if not messagebox.askyesno("Confirmar", "¿Reconstruir el índice de metadatos?\n\n"
+                                   "Se volverán a analizar todos los archivos de la lista."):
+            return
+        
+        files = list(self.current_files)
+        self.probe_cache.rebuild()
+        self.current_files.clear()
+        self.planner.clear()
+        self.file_view.refresh()
+        self.start_import(files)
+    
+    # ===== IMPORTACIÓN EN SEGUNDO PLANO =====
+    
+    def start_import(self, sources: List[str]):
+        """Importar archivos y carpetas sin bloquear la interfaz
+        
+        Las filas aparecen en cuanto se encuentran los archivos y los
+        metadatos se completan a medida que los analiza el grupo de hilos.
+        """
+        if not sources:
+            return
+        
+        self.import_requests.put(sources)
+        if self.importing:
+            # El hilo en curso recogerá la petición al terminar la actual
+            return
+        
+        self.importing = True
+        self.import_added = 0
+        self.import_cancel.clear()
+        self.import_label.config(text="Buscando archivos...")
+        self.import_frame.grid()
+        
+        thread = threading.Thread(target=self._import_thread,
+                                  args=(self.get_max_workers(), self.content_dedup_var.get(),
+                                        self.get_scan_filter()))
+        thread.daemon = True
+        thread.start()
+    
+    def cancel_import(self):
+        """Detener la importación en curso"""
+        if self.importing:
+            self.import_cancel.set()
+            self.import_label.config(text="Cancelando importación...")
+    
+    def get_scan_filter(self) -> ScanFilter:
+        """Filtros de búsqueda de archivos según la configuración"""
         try:
-            # Obtener información básica del archivo
-            file_size = os.path.getsize(filename)
-            size_str = f"{file_size / 1024 / 1024:.2f} MB"
-            
-            # Intentar obtener duración con ffprobe
-            duration_str = "Desconocida"
-            bitrate_str = "Desconocido"
-            
+            max_depth = int(self.config['scan_max_depth'])
+            return ScanFilter(
+                include=tuple(self.config['scan_include']),
+                exclude=tuple(self.config['scan_exclude']),
+                min_size=max(0, int(self.config['scan_min_kb'])) * 1024,
+                max_size=max(0, int(self.config['scan_max_kb'])) * 1024,
+                max_depth=max_depth if max_depth >= 0 else None,
+                follow_symlinks=bool(self.config['scan_follow_symlinks'])
+            )
+        except (TypeError, ValueError):
+            return ScanFilter()
+    
+    def _import_thread(self, workers: int, content_dedup: bool, scan_filter: ScanFilter):
+        """Hilo de importación: descubre archivos y reparte los análisis"""
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while not self.import_cancel.is_set():
+                    try:
+                        sources = self.import_requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._import_sources(sources, pool, content_dedup, scan_filter)
+        except Exception as e:
+            self.output_queue.put(("warning", f"Error importando archivos: {e}"))
+        finally:
+            self.output_queue.put(("import_done", self.import_cancel.is_set()))
+    
+    def _import_sources(self, sources: List[str], pool: ThreadPoolExecutor,
+                        content_dedup: bool = False, scan_filter: Optional[ScanFilter] = None):
+        """Importar un grupo de rutas enviando filas y metadatos por lotes"""
+        results = queue.Queue()
+        submitted = 0
+        completed = 0
+        batch = []
+        last_post = time.monotonic()
+        
+        def probe(path, size):
             try:
-                cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                      '-show_format', '-show_streams', filename]
+                return path, size, self.probe_cache.get(path)
+            except Exception:
+                return path, size, None
+        
+        def on_done(future):
+            results.put(None if future.cancelled() else future.result())
+        
+        def collect(wait: bool):
+            """Recoger análisis terminados y enviarlos a Tk en grupos"""
+            nonlocal completed, batch, last_post
+            while completed < submitted:
+                try:
+                    item = results.get(timeout=0.1) if wait else results.get_nowait()
+                except queue.Empty:
+                    if not wait or self.import_cancel.is_set():
+                        break
+                    item = False
                 
-                if os.path.exists("ffprobe.exe"):
-                    cmd[0] = "ffprobe.exe"
+                if item is not False:
+                    completed += 1
+                    if item:
+                        batch.append(item)
                 
-                # Usar shell=True para Windows
-                result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-                if result.returncode == 0:
-                    info = json.loads(result.stdout)
-                    format_info = info.get('format', {})
-                    
-                    duration = float(format_info.get('duration', 0))
-                    mins, secs = divmod(duration, 60)
-                    duration_str = f"{int(mins)}:{int(secs):02d}"
-                    
-                    bitrate = int(format_info.get('bit_rate', 0))
-                    bitrate_str = f"{bitrate / 1000:.0f} kbps"
-            except Exception as e:
-                print(f"Error obteniendo metadatos: {e}")
-            
-            # Añadir al treeview
-            self.files_tree.insert('', 'end', values=(
-                os.path.basename(filename),
-                size_str,
-                duration_str,
-                bitrate_str,
-                os.path.dirname(filename)
-            ))
-            
-        except Exception as e:
-            self.update_status(f"✗ Error al añadir archivo: {str(e)}")
+                now = time.monotonic()
+                if batch and (len(batch) >= IMPORT_CHUNK_SIZE or now - last_post >= IMPORT_FLUSH_INTERVAL):
+                    self.output_queue.put(("import_meta", batch))
+                    self.output_queue.put(("import_progress", (completed, submitted)))
+                    batch = []
+                    last_post = now
+        
+        chunk = []
+        futures = []
+        last_chunk = 0.0
+        
+        def send_chunk():
+            nonlocal submitted, last_chunk
+            # Primero las filas (con datos provisionales), después los análisis
+            self.output_queue.put(("import_rows", list(chunk)))
+            for path, size, _ in chunk:
+                future = pool.submit(probe, path, size)
+                future.add_done_callback(on_done)
+                futures.append(future)
+                submitted += 1
+            chunk.clear()
+            last_chunk = time.monotonic()
+        
+        for path, size in iter_sources(sources, scan_filter, self.import_cancel):
+            try:
+                # La identidad de contenido se calcula aquí para no leer en el hilo de Tk
+                identity = content_identity(path, size) if content_dedup else None
+            except OSError:
+                continue
+            chunk.append((path, size, identity))
+            # El primer archivo se envía enseguida; después, por grupos o por tiempo
+            if (len(chunk) >= IMPORT_CHUNK_SIZE
+                    or time.monotonic() - last_chunk >= IMPORT_FLUSH_INTERVAL):
+                send_chunk()
+                collect(wait=False)
+        
+        if chunk and not self.import_cancel.is_set():
+            send_chunk()
+        
+        collect(wait=True)
+        if self.import_cancel.is_set():
+            for future in futures:
+                future.cancel()
+        
+        if batch:
+            self.output_queue.put(("import_meta", batch))
+        self.output_queue.put(("import_progress", (completed, submitted)))
+    
+    def on_import_rows(self, rows: List[Tuple[str, int, Optional[str]]]):
+        """Añadir a la lista un grupo de archivos con datos provisionales"""
+        for path, size, identity in rows:
+            if not self.current_files.add(path, identity, size):
+                continue
+            self.planner.add(path, size)
+            self.import_added += 1
+        self.update_file_count()
+        self.schedule_list_refresh()
+    
+    def on_import_meta(self, batch: List[Tuple[str, int, Optional[ProbeInfo]]]):
+        """Completar las filas con los metadatos recibidos"""
+        for path, size, info in batch:
+            row = self.current_files.row(path)
+            if row:
+                row.size = size
+                row.info = info
+                row.probed = True
+            self.planner.update(path, size, info)
+        self.schedule_size_preview()
+        self.schedule_list_refresh()
+    
+    def on_import_done(self, cancelled: bool):
+        """Finalizar la importación (o encadenar la siguiente petición)"""
+        self.probe_cache.flush()
+        self.importing = False
+        self.import_frame.grid_remove()
+        self.update_file_count()
+        
+        if cancelled:
+            # Descartar las peticiones que quedaran en cola
+            while not self.import_requests.empty():
+                self.import_requests.get_nowait()
+            self.update_status(f"⚠ Importación cancelada ({self.import_added} archivos añadidos)")
+        elif not self.import_requests.empty():
+            # Llegaron más archivos mientras terminaba el hilo
+            added = self.import_added
+            pending = self.import_requests.get_nowait()
+            self.start_import(pending)
+            self.import_added = added
+        elif self.import_added > 0:
+            self.update_status(f"✓ Añadidos {self.import_added} archivos")
+        else:
+            messagebox.showwarning("Advertencia", "No se encontraron archivos MP3 nuevos.")
+    
+    def format_file_row(self, row: FileRow) -> Tuple:
+        """Valores de una fila visible de la lista"""
+        size_str = f"{row.size / 1024 / 1024:.2f} MB"
+        
+        info = row.info
+        if not row.probed:
+            duration_str = bitrate_str = "..."
+        elif info:
+            mins, secs = divmod(info.duration, 60)
+            duration_str = f"{int(mins)}:{int(secs):02d}"
+            bitrate_str = f"{info.bit_rate / 1000:.0f} kbps"
+        else:
+            duration_str = "Desconocida"
+            bitrate_str = "Desconocido"
+        
+        estimated_str = f"{row.estimated / 1024 / 1024:.2f} MB" if row.estimated >= 0 else ""
+        
+        return (
+            os.path.basename(row.path),
+            size_str,
+            estimated_str,
+            duration_str,
+            bitrate_str,
+            row.status,
+            os.path.dirname(row.path)
+        )
+    
+    def schedule_list_refresh(self):
+        """Reconstruir el orden de la lista poco después de recibir filas"""
+        if self.list_refresh_job:
+            return
+        
+        def refresh():
+            self.list_refresh_job = None
+            self.file_view.refresh()
+        
+        self.list_refresh_job = self.root.after(LIST_REFRESH_DELAY_MS, refresh)
     
     def update_file_count(self):
         """Actualizar contador de archivos"""
         count = len(self.current_files)
         self.file_count_label.config(text=f"{count} archivo{'s' if count != 1 else ''} seleccionado{'s' if count != 1 else ''}")
+        self.schedule_size_preview()
     
     # ===== MÉTODOS PARA CONFIGURACIÓN DE SALIDA =====
     
@@ -647,99 +1084,6 @@ Ejemplos:
 """
         messagebox.showinfo("Ayuda - Patrón de Nombres", help_text)
     
-    def generate_output_filename(self, input_file: str, index: int, total: int) -> str:
-        """Generar nombre de archivo de salida basado en el patrón"""
-        pattern = self.name_pattern.get()
-        base_name = os.path.splitext(os.path.basename(input_file))[0]
-        ext = os.path.splitext(input_file)[1]
-        
-        # Obtener información adicional del archivo si es posible
-        artist = "Unknown"
-        title = "Unknown"
-        
-        try:
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                  '-show_format', input_file]
-            
-            if os.path.exists("ffprobe.exe"):
-                cmd[0] = "ffprobe.exe"
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
-                tags = info.get('format', {}).get('tags', {})
-                artist = tags.get('artist', 'Unknown')
-                title = tags.get('title', 'Unknown')
-        except:
-            pass
-        
-        # Reemplazar variables en el patrón
-        now = datetime.now()
-        
-        # Obtener bitrate para el nombre del archivo
-        bitrate_str = self.get_target_bitrate()
-        bitrate_display = "original" if bitrate_str == "original" else bitrate_str.replace('k', '') + "kbps"
-        
-        replacements = {
-            '{filename}': base_name,
-            '{ext}': ext,
-            '{bitrate}': bitrate_display,
-            '{date}': now.strftime('%Y-%m-%d'),
-            '{time}': now.strftime('%H-%M-%S'),
-            '{counter}': f"{index + 1:02d}",
-            '{total}': f"{total:02d}",
-            '{artist}': re.sub(r'[^\w\-_\. ]', '_', artist),
-            '{title}': re.sub(r'[^\w\-_\. ]', '_', title)
-        }
-        
-        output_name = pattern
-        for key, value in replacements.items():
-            output_name = output_name.replace(key, str(value))
-        
-        # Asegurar que el nombre sea válido
-        output_name = re.sub(r'[^\w\-_\. ]', '_', output_name)
-        
-        # Añadir extensión si no la tiene
-        if not output_name.endswith('.mp3'):
-            output_name += '.mp3'
-        
-        return output_name
-    
-    def get_output_path(self, input_file: str, index: int, total: int) -> str:
-        """Obtener ruta completa de salida para un archivo"""
-        # Determinar carpeta de salida
-        output_dir = self.output_folder.get()
-        if not output_dir or not os.path.exists(output_dir):
-            output_dir = os.path.dirname(input_file)
-        
-        # Si se mantiene estructura de carpetas
-        if self.preserve_folder_var.get():
-            # Obtener ruta relativa si hay archivos en diferentes carpetas
-            if len(self.current_files) > 1:
-                try:
-                    common_path = os.path.commonpath([os.path.dirname(f) for f in self.current_files])
-                    rel_path = os.path.relpath(os.path.dirname(input_file), common_path)
-                    output_dir = os.path.join(output_dir, rel_path)
-                except:
-                    pass
-            os.makedirs(output_dir, exist_ok=True)
-        
-        # Generar nombre de archivo
-        filename = self.generate_output_filename(input_file, index, total)
-        
-        # Verificar si ya existe y manejar sobreescritura
-        output_path = os.path.join(output_dir, filename)
-        
-        if os.path.exists(output_path) and not self.overwrite_var.get():
-            # Añadir sufijo único
-            base, ext = os.path.splitext(output_path)
-            counter = 1
-            while os.path.exists(f"{base}_{counter}{ext}"):
-                counter += 1
-            output_path = f"{base}_{counter}{ext}"
-        
-        return output_path
-    
     # ===== MÉTODOS DE PROCESAMIENTO =====
     
     def process_all_files(self):
@@ -762,40 +1106,173 @@ Ejemplos:
         # Guardar configuración antes de procesar
         self.save_config()
         
+        # Tomar una copia de la configuración: los hilos no deben tocar Tk
+        try:
+            options = self.collect_options()
+        except ValueError:
+            messagebox.showerror("Error", "Los valores de silencio y tamaño deben ser numéricos.")
+            return
+        files = list(self.current_files)
+        
+        # Ofrecer reanudar si este mismo lote quedó a medias
+        resume = False
+        if self.journal:
+            done, total = self.journal.progress(JobJournal.batch_id(files, options))
+            if 0 < done < total:
+                resume = messagebox.askyesno(
+                    "Reanudar",
+                    f"Este lote se interrumpió con {done} de {total} archivos terminados.\n\n"
+                    f"¿Reanudar y procesar solo los pendientes?")
+        
         # Iniciar procesamiento
         self.processing = True
         self.process_btn.config(state='disabled')
-        self.update_status(f"Iniciando procesamiento de {file_count} archivos...")
-        
-        thread = threading.Thread(target=self._process_all_files_thread)
+        self.cancel_btn.config(state='normal')
+        self.progress_var.set(0.0)
+        for path in files:
+            self.set_file_status(path, "En cola")
+        self.update_status(f"Iniciando procesamiento de {file_count} archivos "
+                           f"({min(options.max_workers, file_count)} en paralelo)...")
+        
+        thread = threading.Thread(target=self._process_all_files_thread, args=(files, options, resume))
         thread.daemon = True
         thread.start()
     
-    def _process_all_files_thread(self):
-        """Hilo para procesar todos los archivos"""
+    def collect_options(self) -> ProcessingOptions:
+        """Leer la configuración actual de la interfaz"""
+        start_sec = float(self.start_seconds.get() or 0)
+        start_ms = float(self.start_millis.get() or 0) / 1000
+        end_sec = float(self.end_seconds.get() or 0)
+        end_ms = float(self.end_millis.get() or 0) / 1000
+        
+        # Tamaño exacto en MB (mismas unidades que la lista de archivos)
+        target_bytes = int(float(self.target_size_var.get().replace(',', '.') or 0) * 1024 * 1024)
+        per_file = self.target_scope_var.get() == "por archivo"
+        
+        return ProcessingOptions(
+            silence_start=start_sec + start_ms,
+            silence_end=end_sec + end_ms,
+            bitrate=self.get_target_bitrate(),
+            preserve_meta=self.preserve_meta.get(),
+            output_folder=self.output_folder.get(),
+            name_pattern=self.name_pattern.get(),
+            overwrite=self.overwrite_var.get(),
+            preserve_folders=self.preserve_folder_var.get(),
+            common_dir=common_directory(list(self.current_files)),
+            max_workers=self.get_max_workers(),
+            stream_copy=self.stream_copy_var.get(),
+            scratch_dir=self.config.get('scratch_dir', ""),
+            fsync=bool(self.config.get('fsync_outputs', False)),
+            skip_unchanged=self.skip_unchanged_var.get(),
+            target_size=target_bytes if per_file else 0,
+            target_total=0 if per_file else target_bytes,
+            native_splice=bool(self.config.get('native_splice', True))
+        )
+    
+    def cancel_processing(self):
+        """Cancelar el lote en curso y detener los procesos de FFmpeg activos"""
+        if not self.processing:
+            return
+        
+        self.processor.cancel()
+        self.cancel_btn.config(state='disabled')
+        self.update_status("⚠ Cancelando procesamiento...")
+    
+    def show_timings(self):
+        """Mostrar los tiempos por etapa del último lote y permitir exportarlos"""
+        timings = self.last_timings
+        if not timings:
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Tiempos del último lote")
+        window.columnconfigure(0, weight=1)
+        window.rowconfigure(0, weight=1)
+        
+        text = tk.Text(window, font=('Courier', 9), width=100, height=30, wrap='none')
+        text.insert('1.0', self.format_timings(timings))
+        text.config(state='disabled')
+        text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=text.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        text.config(yscrollcommand=scrollbar.set)
+        
+        buttons = ttk.Frame(window, padding=5)
+        buttons.grid(row=1, column=0, columnspan=2, sticky=tk.E)
+        ttk.Button(buttons, text="Exportar informe...",
+                   command=lambda: self.export_timings(timings, window)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons, text="Exportar traza...",
+                   command=lambda: self.export_timings(timings, window, trace=True)).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(buttons, text="Cerrar", command=window.destroy).pack(side=tk.LEFT)
+    
+    def format_timings(self, timings: RunTimings) -> str:
+        """Tabla resumen por etapa seguida del histograma de duraciones"""
+        lines = [f"{'Etapa':<12}{'Veces':>7}{'Total (s)':>12}{'Media (ms)':>12}{'p95 (ms)':>11}"]
+        for name, stats in sorted(timings.stage_summary().items()):
+            lines.append(f"{name:<12}{stats['count']:>7}{stats['total']:>12.2f}"
+                         f"{stats['mean'] * 1000:>12.1f}{stats['p95'] * 1000:>11.1f}")
+        return "\n".join(lines) + "\n\n" + timings.histogram()
+    
+    def export_timings(self, timings: RunTimings, parent, trace: bool = False):
+        """Guardar el informe de tiempos (JSON o CSV) o la traza de Chrome"""
+        if trace:
+            path = filedialog.asksaveasfilename(parent=parent, title="Exportar traza (chrome://tracing, Perfetto)",
+                                                defaultextension=".json", filetypes=[("JSON", "*.json")])
+        else:
+            path = filedialog.asksaveasfilename(parent=parent, title="Exportar informe de tiempos",
+                                                defaultextension=".json",
+                                                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+        if not path:
+            return
+        
         try:
-            total_files = len(self.current_files)
-            success_count = 0
-            error_count = 0
-            
-            for i, input_file in enumerate(self.current_files):
-                if not os.path.exists(input_file):
-                    self.output_queue.put(("warning", f"Archivo no encontrado: {input_file}"))
-                    error_count += 1
-                    continue
-                
-                # Procesar archivo individual
-                output_file = self.get_output_path(input_file, i, total_files)
-                result = self._process_single_file(input_file, output_file)
-                
-                if result:
-                    success_count += 1
-                    self.update_status(f"Procesando... ({i+1}/{total_files}) - {os.path.basename(input_file)}")
+            if trace:
+                timings.write_chrome_trace(path)
+            elif path.lower().endswith('.csv'):
+                timings.write_csv(path)
+            else:
+                timings.write_json(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudo guardar el archivo: {e}", parent=parent)
+            return
+        self.update_status(f"✓ Tiempos guardados en {os.path.basename(path)}")
+    
+    def _process_all_files_thread(self, files: List[str], options: ProcessingOptions,
+                                  resume: bool = False):
+        """Hilo coordinador: reparte los archivos entre un grupo de trabajadores"""
+        try:
+            def on_result(result, done_count, total_files):
+                if result.skipped:
+                    state = "Ya hecho"
+                elif result.success:
+                    state = "Hecho"
+                elif result.cancelled:
+                    state = "Cancelado"
+                elif result.error_class:
+                    state = f"Error: {ERROR_CLASSES[result.error_class]}"
                 else:
-                    error_count += 1
+                    state = "Error"
+                self.output_queue.put(("job_done", (result.input_file, state)))
+            
+            def on_progress(progress):
+                self.output_queue.put(("progress", progress))
+            
+            timings = RunTimings()
+            results = self.processor.run_batch(files, options, on_result, on_progress,
+                                               self.journal, resume, timings)
+            self.output_queue.put(("timings", timings))
             
-            # Proceso completado
-            if success_count > 0:
+            # Resumen en el orden original de la lista
+            summary = summarize_results(results)
+            success_count = summary['succeeded']
+            cancelled_count = summary['cancelled']
+            error_count = summary['failed']
+            
+            if self.processor.cancel_event.is_set():
+                self.output_queue.put(("warning",
+                    f"Procesamiento cancelado: {success_count} completados, "
+                    f"{cancelled_count} cancelados, {error_count} con error"))
+            elif success_count > 0:
                 self.output_queue.put(("success", 
                     f"¡Procesamiento completado!\n\n"
                     f"Archivos procesados exitosamente: {success_count}\n"
@@ -808,199 +1285,80 @@ Ejemplos:
         except Exception as e:
             self.output_queue.put(("error", f"Error inesperado: {str(e)}"))
         finally:
-            self.processing = False
-            self.process_btn.config(state='normal')
+            self.output_queue.put(("done", None))
     
-    def _process_single_file(self, input_file: str, output_file: str) -> bool:
-        """Procesar un solo archivo MP3"""
-        try:
-            # Calcular duración de silencio
-            start_sec = float(self.start_seconds.get() or 0)
-            start_ms = float(self.start_millis.get() or 0) / 1000
-            end_sec = float(self.end_seconds.get() or 0)
-            end_ms = float(self.end_millis.get() or 0) / 1000
-            
-            silence_start = start_sec + start_ms
-            silence_end = end_sec + end_ms
-            
-            # Obtener bitrate objetivo
-            bitrate_str = self.get_target_bitrate()
-            
-            # Determinar qué ffmpeg usar
-            ffmpeg_cmd = "ffmpeg.exe" if os.path.exists("ffmpeg.exe") else "ffmpeg"
-            
-            # Crear carpeta de salida si no existe
-            os.makedirs(os.path.dirname(output_file), exist_ok=True)
-            
-            # Si el bitrate es "original", obtener el bitrate original del archivo
-            if bitrate_str == "original":
-                original_bitrate = self.get_original_bitrate(input_file)
-                if original_bitrate:
-                    # Convertir a formato de FFmpeg (kbps)
-                    bitrate_str = f"{original_bitrate // 1000}k"
-                else:
-                    bitrate_str = "128k"
-            
-            # Construir comando base
-            cmd_base = [ffmpeg_cmd, '-i', input_file, '-c:a', 'libmp3lame']
-            
-            # Configurar bitrate
-            if bitrate_str != "vbr":
-                cmd_base.extend(['-b:a', bitrate_str])
-            else:
-                cmd_base.extend(['-q:a', '2'])
-            
-            # Preservar metadatos si está marcado
-            if self.preserve_meta.get():
-                cmd_base.extend(['-map_metadata', '0', '-id3v2_version', '3'])
-            
-            # Procesar silencio al inicio si es necesario
-            temp_files = []
-            current_input = input_file
-            
-            if silence_start > 0:
-                temp_silence = os.path.join(os.path.dirname(input_file), 
-                                          f"temp_silence_start_{os.path.basename(input_file)}.mp3")
-                temp_files.append(temp_silence)
-                
-                # Crear archivo de silencio
-                silence_cmd = [
-                    ffmpeg_cmd, '-f', 'lavfi',
-                    '-i', f'anullsrc=channel_layout=stereo:sample_rate=44100',
-                    '-t', str(silence_start),
-                    '-c:a', 'libmp3lame',
-                    '-q:a', '2',
-                    temp_silence,
-                    '-y'
-                ]
-                
-                result = subprocess.run(silence_cmd, capture_output=True, text=True, shell=True)
-                if result.returncode != 0:
-                    self.output_queue.put(("warning", f"Error al crear silencio inicial para {os.path.basename(input_file)}"))
-                    return False
-                
-                # Combinar silencio + audio original
-                temp_combined = os.path.join(os.path.dirname(input_file),
-                                          f"temp_combined_{os.path.basename(input_file)}.mp3")
-                temp_files.append(temp_combined)
-                
-                combine_cmd = [
-                    ffmpeg_cmd, '-i', temp_silence, '-i', current_input,
-                    '-filter_complex', '[0:a][1:a]concat=n=2:v=0:a=1',
-                    '-c:a', 'libmp3lame'
-                ]
-                
-                if bitrate_str != "vbr":
-                    combine_cmd.extend(['-b:a', bitrate_str])
-                else:
-                    combine_cmd.extend(['-q:a', '2'])
-                
-                if self.preserve_meta.get():
-                    combine_cmd.extend(['-map_metadata', '1', '-id3v2_version', '3'])
-                
-                combine_cmd.append(temp_combined)
-                combine_cmd.append('-y')
-                
-                result = subprocess.run(combine_cmd, capture_output=True, text=True, shell=True)
-                if result.returncode != 0:
-                    self.output_queue.put(("warning", f"Error al combinar silencio inicial para {os.path.basename(input_file)}"))
-                    return False
-                
-                current_input = temp_combined
-            
-            # Procesar silencio al final si es necesario
-            if silence_end > 0:
-                temp_silence_end = os.path.join(os.path.dirname(input_file),
-                                              f"temp_silence_end_{os.path.basename(input_file)}.mp3")
-                temp_files.append(temp_silence_end)
-                
-                # Crear silencio para el final
-                silence_cmd = [
-                    ffmpeg_cmd, '-f', 'lavfi',
-                    '-i', f'anullsrc=channel_layout=stereo:sample_rate=44100',
-                    '-t', str(silence_end),
-                    '-c:a', 'libmp3lame',
-                    '-q:a', '2',
-                    temp_silence_end,
-                    '-y'
-                ]
-                
-                result = subprocess.run(silence_cmd, capture_output=True, text=True, shell=True)
-                if result.returncode != 0:
-                    self.output_queue.put(("warning", f"Error al crear silencio final para {os.path.basename(input_file)}"))
-                    return False
-                
-                # Combinar audio actual + silencio final
-                final_cmd = [
-                    ffmpeg_cmd, '-i', current_input, '-i', temp_silence_end,
-                    '-filter_complex', '[0:a][1:a]concat=n=2:v=0:a=1',
-                    '-c:a', 'libmp3lame'
-                ]
-                
-                if bitrate_str != "vbr":
-                    final_cmd.extend(['-b:a', bitrate_str])
-                else:
-                    final_cmd.extend(['-q:a', '2'])
-                
-                if self.preserve_meta.get():
-                    final_cmd.extend(['-map_metadata', '0', '-id3v2_version', '3'])
-                
-                final_cmd.append(output_file)
-                final_cmd.append('-y')
-                
-                result = subprocess.run(final_cmd, capture_output=True, text=True, shell=True)
-                if result.returncode != 0:
-                    self.output_queue.put(("warning", f"Error al combinar silencio final para {os.path.basename(input_file)}"))
-                    return False
-                
-            else:
-                # Solo cambiar bitrate (sin silencio final)
-                cmd = cmd_base + [output_file, '-y']
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-                if result.returncode != 0:
-                    self.output_queue.put(("warning", f"Error al procesar {os.path.basename(input_file)}"))
-                    return False
-            
-            # Limpiar archivos temporales
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
-            
-            # Eliminar archivo temporal intermedio si existe
-            if current_input != input_file and os.path.exists(current_input):
-                try:
-                    os.remove(current_input)
-                except:
-                    pass
-            
-            return True
-            
-        except Exception as e:
-            self.output_queue.put(("warning", f"Error procesando {os.path.basename(input_file)}: {str(e)}"))
-            return False
+    def set_file_status(self, path: str, state: str):
+        """Actualizar la columna de estado de un archivo de la lista"""
+        row = self.current_files.row(path)
+        if row:
+            row.status = state
+            self.file_view.request_render()
+    
+    def on_progress(self, progress: dict):
+        """Reflejar el avance de FFmpeg en la barra de progreso y en la lista"""
+        self.progress_var.set(progress['percent'])
+        
+        if progress['file_percent'] < 100:
+            self.set_file_status(progress['input_file'], f"{progress['file_percent']:.0f}%")
+        
+        status = (f"Procesando... ({progress['completed']}/{progress['total']}) "
+                  f"{progress['percent']:.0f}%")
+        if progress['speed']:
+            status += f" - {progress['speed']:.1f}x"
+        if progress['eta_seconds'] is not None:
+            mins, secs = divmod(int(progress['eta_seconds']), 60)
+            status += f" - quedan {mins}:{secs:02d}"
+        self.update_status(status)
+    
+    # ===== VISTA PREVIA DE TAMAÑOS =====
     
-    def get_original_bitrate(self, input_file):
-        """Obtener el bitrate original de un archivo MP3"""
+    def bind_size_preview(self):
+        """Conectar los controles que cambian el tamaño de salida con la vista previa"""
+        for var in (self.bitrate_var, self.stream_copy_var, self.target_size_var, self.target_scope_var):
+            var.trace_add('write', lambda *args: self.schedule_size_preview())
+        
+        for widget in (self.start_seconds, self.start_millis, self.end_seconds,
+                       self.end_millis, self.custom_bitrate):
+            for sequence in ('<KeyRelease>', '<<Increment>>', '<<Decrement>>'):
+                widget.bind(sequence, lambda event: self.schedule_size_preview(), add='+')
+    
+    def schedule_size_preview(self):
+        """Recalcular la vista previa poco después del último cambio"""
+        if self.preview_job:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(PREVIEW_DELAY_MS, self.refresh_size_preview)
+    
+    def refresh_size_preview(self):
+        """Estimar el tamaño de salida de toda la lista con la configuración actual"""
+        self.preview_job = None
+        
+        if not len(self.planner):
+            self.estimate_label.config(text="")
+            return
+        
         try:
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                  '-show_format', input_file]
-            
-            if os.path.exists("ffprobe.exe"):
-                cmd[0] = "ffprobe.exe"
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-            if result.returncode == 0:
-                info = json.loads(result.stdout)
-                format_info = info.get('format', {})
-                bitrate = int(format_info.get('bit_rate', 128000))
-                return bitrate
-        except:
-            pass
-        return None
+            options = self.collect_options()
+        except ValueError:
+            # Valor a medio escribir: se recalcula en la siguiente tecla
+            return
+        
+        plan = self.planner.estimate(options)
+        total_mb = plan.total_estimated / 1024 / 1024
+        delta_mb = (plan.total_estimated - plan.total_original) / 1024 / 1024
+        mins, secs = divmod(int(plan.total_duration), 60)
+        hours, mins = divmod(mins, 60)
+        self.estimate_label.config(
+            text=f"Tamaño final estimado: {total_mb:.2f} MB ({delta_mb:+.2f} MB) - "
+                 f"duración total {hours}:{mins:02d}:{secs:02d} - "
+                 f"{plan.known} de {len(self.planner)} archivos analizados")
+        
+        # El planificador y la lista comparten el orden de inserción
+        for row, size in zip(self.current_files.rows(), plan.estimated):
+            row.estimated = size
+        if self.file_view.sort_column == 'estimated':
+            self.file_view.refresh()
+        else:
+            self.file_view.request_render()
     
     def calculate_all_sizes(self):
         """Calcular tamaños estimados para todos los archivos"""
@@ -1008,58 +1366,26 @@ Ejemplos:
             messagebox.showinfo("Información", "No hay archivos para calcular.")
             return
         
-        total_original = 0
-        total_estimated = 0
+        # Leer la configuración una sola vez
+        try:
+            options = self.collect_options()
+        except ValueError:
+            messagebox.showerror("Error", "Los valores de silencio y tamaño deben ser numéricos.")
+            return
         
-        for input_file in self.current_files:
-            if os.path.exists(input_file):
-                try:
-                    # Obtener información del archivo
-                    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
-                          '-show_format', input_file]
-                    
-                    if os.path.exists("ffprobe.exe"):
-                        cmd[0] = "ffprobe.exe"
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-                    if result.returncode == 0:
-                        info = json.loads(result.stdout)
-                        format_info = info.get('format', {})
-                        
-                        duration = float(format_info.get('duration', 0))
-                        original_bitrate = int(format_info.get('bit_rate', 128000))
-                        
-                        # Calcular duración adicional
-                        start_sec = float(self.start_seconds.get() or 0)
-                        start_ms = float(self.start_millis.get() or 0) / 1000
-                        end_sec = float(self.end_seconds.get() or 0)
-                        end_ms = float(self.end_millis.get() or 0) / 1000
-                        total_additional = start_sec + start_ms + end_sec + end_ms
-                        total_duration = duration + total_additional
-                        
-                        # Obtener bitrate objetivo
-                        bitrate_str = self.get_target_bitrate()
-                        target_bitrate = self.parse_bitrate(bitrate_str, original_bitrate)
-                        
-                        # Calcular tamaños
-                        original_size = (original_bitrate * duration) / 8
-                        estimated_size = (target_bitrate * total_duration) / 8
-                        
-                        total_original += original_size
-                        total_estimated += estimated_size
-                except:
-                    pass
+        # Toda la lista de una vez, con los metadatos ya en caché
+        plan = self.planner.estimate(options)
         
         # Mostrar resultados
-        total_original_mb = total_original / 1024 / 1024
-        total_estimated_mb = total_estimated / 1024 / 1024
+        total_original_mb = plan.total_original / 1024 / 1024
+        total_estimated_mb = plan.total_estimated / 1024 / 1024
         difference_mb = total_estimated_mb - total_original_mb
         
         messagebox.showinfo("Cálculo de Tamaños",
                           f"Tamaño total original: {total_original_mb:.2f} MB\n"
                           f"Tamaño total estimado: {total_estimated_mb:.2f} MB\n"
                           f"Diferencia: {difference_mb:+.2f} MB\n\n"
-                          f"({len(self.current_files)} archivos analizados)")
+                          f"({plan.known} archivos analizados)")
     
     # ===== MÉTODOS HEREDADOS/COMPATIBLES =====
     
@@ -1114,26 +1440,12 @@ Ejemplos:
         
         return "original"
     
-    def parse_bitrate(self, bitrate_str, original_bitrate=128000):
-        """Parsear string de bitrate a bps"""
-        if bitrate_str == "vbr":
-            # Para previsualización, usar un valor promedio
-            return 128000
-        elif bitrate_str == "original":
-            return original_bitrate
-        
-        match = re.search(r'(\d+)', bitrate_str)
-        if match:
-            return int(match.group(1)) * 1000
-        
-        return 128000
-    
     def open_output_folder(self):
         """Abrir la carpeta de salida"""
         folder = self.output_folder.get()
         if not folder or not os.path.exists(folder):
             if self.current_files:
-                folder = os.path.dirname(self.current_files[0])
+                folder = os.path.dirname(self.current_files.first())
             else:
                 messagebox.showinfo("Información", "No hay carpeta de salida definida.")
                 return
@@ -1171,7 +1483,13 @@ Ejemplos:
     
     def on_exit(self):
         """Manejar salida de la aplicación"""
+        self.cancel_import()
+        self.cancel_processing()
         self.save_config()
+        if self.probe_cache.index:
+            self.probe_cache.index.close()
+        if self.journal:
+            self.journal.close()
         self.root.destroy()
     
     def process_output_queue(self):
@@ -1191,6 +1509,38 @@ Ejemplos:
                 elif msg_type == "warning":
                     self.update_status(f"⚠ {content[:60]}...")
                     
+                elif msg_type == "status":
+                    self.update_status(content)
+                    
+                elif msg_type == "import_rows":
+                    self.on_import_rows(content)
+                    
+                elif msg_type == "import_meta":
+                    self.on_import_meta(content)
+                    
+                elif msg_type == "import_progress":
+                    done, total = content
+                    self.import_label.config(text=f"Analizando archivos: {done}/{total}")
+                    
+                elif msg_type == "import_done":
+                    self.on_import_done(content)
+                    
+                elif msg_type == "progress":
+                    self.on_progress(content)
+                    
+                elif msg_type == "timings":
+                    self.last_timings = content
+                    self.timings_btn.config(state='normal')
+                    
+                elif msg_type == "job_done":
+                    path, state = content
+                    self.set_file_status(path, state)
+                    
+                elif msg_type == "done":
+                    self.processing = False
+                    self.process_btn.config(state='normal')
+                    self.cancel_btn.config(state='disabled')
+                    
         except queue.Empty:
             pass
         finally:
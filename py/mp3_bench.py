@@ -0,0 +1,329 @@
+"""Banco de pruebas de rendimiento del procesamiento
+
+Genera archivos MP3 sintéticos con FFmpeg (``sine``/``anullsrc``) y mide
+las etapas de inspección, importación, estimación de tamaños y
+codificación para varios escenarios de silencio y bitrate. El informe se
+escribe en JSON para poder comparar versiones. No usa la interfaz gráfica.
+
+Ejemplo:
+    python mp3_bench.py --profile quick --label "antes del cambio" --report bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from mp3_core import (NUMPY_AVAILABLE, TOOLS, FileList, MP3Processor, ProbeCache, ProbeIndex,
+                      ProcessingOptions, RunTimings, SilenceCache, SizePlanner,
+                      default_worker_count, iter_sources, probe_file, summarize_results)
+
+# resource solo existe en sistemas tipo Unix
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class FixtureSpec:
+    """Archivo de prueba a generar"""
+    signal: str        # 'sine' (tono) o 'anullsrc' (silencio digital)
+    vbr: bool
+    channels: int
+    sample_rate: int
+    duration: float    # Segundos
+
+    @property
+    def filename(self) -> str:
+        mode = "vbr" if self.vbr else "cbr"
+        return f"{self.signal}_{mode}_{self.channels}ch_{self.sample_rate}_{self.duration:g}s.mp3"
+
+
+# Duraciones por perfil: cada uno amplía el anterior; 'full' añade
+# además archivos de 3 horas
+PROFILES = {
+    'quick': (1, 10),
+    'standard': (1, 10, 60),
+    'full': (1, 10, 60, 600),
+}
+LONG_DURATION = 3 * 3600
+
+# Escenarios de codificación: silencio al inicio/final y bitrate
+SCENARIOS = {
+    'silencio_original': dict(silence_start=1.0, silence_end=1.0, bitrate="original"),
+    'silencio_original_ffmpeg': dict(silence_start=1.0, silence_end=1.0, bitrate="original", native_splice=False),
+    'silencio_128k': dict(silence_start=0.5, silence_end=0.5, bitrate="128k"),
+    'sin_silencio_64k': dict(silence_start=0.0, silence_end=0.0, bitrate="64k"),
+    'silencio_vbr': dict(silence_start=1.0, silence_end=0.0, bitrate="vbr"),
+}
+
+
+def fixture_specs(profile: str) -> List[FixtureSpec]:
+    """Combinaciones de CBR/VBR, mono/estéreo y frecuencias para un perfil"""
+    specs = []
+    for duration in PROFILES[profile]:
+        for vbr in (False, True):
+            for channels in (1, 2):
+                for sample_rate in (22050, 44100, 48000):
+                    specs.append(FixtureSpec('sine', vbr, channels, sample_rate, duration))
+            # Silencio digital: las tramas VBR salen casi vacías
+            specs.append(FixtureSpec('anullsrc', vbr, 2, 44100, duration))
+    if profile == 'full':
+        for vbr in (False, True):
+            specs.append(FixtureSpec('sine', vbr, 2, 44100, LONG_DURATION))
+    return specs
+
+
+def generate_fixture(spec: FixtureSpec, folder: str) -> str:
+    """Generar un archivo de prueba (se reutiliza si ya existe)"""
+    path = os.path.join(folder, spec.filename)
+    if os.path.exists(path):
+        return path
+
+    if spec.signal == 'sine':
+        source = f"sine=frequency=440:sample_rate={spec.sample_rate}:duration={spec.duration:g}"
+    else:
+        layout = "stereo" if spec.channels == 2 else "mono"
+        source = f"anullsrc=r={spec.sample_rate}:cl={layout}:d={spec.duration:g}"
+    quality = ['-q:a', '4'] if spec.vbr else ['-b:a', '128k']
+
+    temp_file = path + ".tmp"
+    cmd = [TOOLS.path('ffmpeg'), '-v', 'error', '-y', '-f', 'lavfi', '-i', source,
+           '-ac', str(spec.channels), '-c:a', 'libmp3lame', *quality,
+           '-metadata', f'title={spec.filename}', '-f', 'mp3', temp_file]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise RuntimeError(f"No se pudo generar {spec.filename}: {result.stderr.strip()}")
+    os.replace(temp_file, path)
+    return path
+
+
+def peak_rss() -> Dict[str, Optional[int]]:
+    """Memoria residente máxima (bytes) de este proceso y de sus hijos"""
+    if not RESOURCE_AVAILABLE:
+        return {'peak_rss_bytes': None, 'children_peak_rss_bytes': None}
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'children_peak_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+class SubprocessCounter:
+    """Cuenta los procesos que se lanzan mientras está activo
+
+    Sustituye temporalmente ``subprocess.Popen`` (que también usa
+    ``subprocess.run``) por una subclase que incrementa el contador.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def counting(self) -> Iterator['SubprocessCounter']:
+        original = subprocess.Popen
+        counter = self
+
+        class CountingPopen(original):
+            def __init__(self, *args, **kwargs):
+                with counter._lock:
+                    counter.count += 1
+                super().__init__(*args, **kwargs)
+
+        subprocess.Popen = CountingPopen
+        try:
+            yield self
+        finally:
+            subprocess.Popen = original
+
+
+@contextmanager
+def measure(stage: str, results: List[Dict], scenario: str = "",
+            files: int = 0, audio_seconds: float = 0.0) -> Iterator[Dict]:
+    """Medir una etapa y añadir su fila al informe
+
+    El bloque puede completar la fila (``files``, ``failed``...) a través
+    del diccionario que recibe.
+    """
+    row = {'stage': stage, 'scenario': scenario, 'files': files,
+           'audio_seconds': audio_seconds, 'failed': 0}
+    counter = SubprocessCounter()
+    start = time.perf_counter()
+    with counter.counting():
+        yield row
+    elapsed = time.perf_counter() - start
+
+    row['elapsed_seconds'] = round(elapsed, 6)
+    row['files_per_second'] = round(row['files'] / elapsed, 3) if elapsed > 0 else None
+    row['audio_seconds_per_second'] = round(row['audio_seconds'] / elapsed, 3) if elapsed > 0 else None
+    row['subprocesses'] = counter.count
+    row.update(peak_rss())
+    results.append(row)
+
+
+def bench_probe(fixtures: List[str], results: List[Dict]):
+    """Inspección en frío de cada archivo (sin caché)"""
+    with measure('probe', results) as row:
+        for path in fixtures:
+            info = probe_file(path, os.stat(path))
+            row['files'] += 1
+            if info:
+                row['audio_seconds'] += info.duration
+            else:
+                row['failed'] += 1
+
+
+def bench_import(folder: str, state_dir: str, workers: int, results: List[Dict]):
+    """Importación como en la ventana: recorrido de carpeta y análisis en paralelo"""
+    index = ProbeIndex(os.path.join(state_dir, "bench_index.db"))
+    try:
+        probe_cache = ProbeCache(index)
+        files = FileList()
+        with measure('import', results) as row:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = []
+                for path, size in iter_sources([folder]):
+                    if files.add(path, size=size):
+                        futures.append(pool.submit(probe_cache.get, path))
+                for future in futures:
+                    info = future.result()
+                    row['files'] += 1
+                    if info:
+                        row['audio_seconds'] += info.duration
+                    else:
+                        row['failed'] += 1
+    finally:
+        index.close()
+
+
+def bench_plan(fixtures: List[str], rows: int, results: List[Dict]):
+    """Estimación de tamaños de una lista grande para cada escenario"""
+    probe_cache = ProbeCache()
+    infos = [(path, probe_cache.get(path)) for path in fixtures]
+    planner = SizePlanner()
+    for i in range(rows):
+        path, info = infos[i % len(infos)]
+        planner.add(f"{path}.{i}", os.path.getsize(path), info)
+    audio_seconds = sum(info.duration for _, info in infos if info) * rows / len(infos)
+
+    for scenario, settings in SCENARIOS.items():
+        with measure('plan', results, scenario, rows, audio_seconds):
+            planner.estimate(ProcessingOptions(**settings))
+
+
+def bench_encode(fixtures: List[str], scenarios: List[str], workers: int, results: List[Dict]):
+    """Codificación completa del lote para cada escenario"""
+    probe_cache = ProbeCache()
+    audio_seconds = sum(info.duration for info in map(probe_cache.get, fixtures) if info)
+
+    for scenario in scenarios:
+        # Carpetas y caché de silencios nuevas para que cada escenario empiece en frío
+        with tempfile.TemporaryDirectory(prefix="mp3bench_") as work_dir:
+            silence_cache = SilenceCache(os.path.join(work_dir, "silence"), 64 * 1024 * 1024)
+            processor = MP3Processor(probe_cache, silence_cache)
+            options = ProcessingOptions(
+                output_folder=os.path.join(work_dir, "salida"),
+                max_workers=workers,
+                overwrite=True,
+                **SCENARIOS[scenario]
+            )
+            os.makedirs(options.output_folder)
+            timings = RunTimings()
+            with measure('encode', results, scenario, len(fixtures), audio_seconds) as row:
+                summary = summarize_results(processor.run_batch(fixtures, options, timings=timings))
+                row['failed'] = summary['failed'] + summary['cancelled']
+            # Desglose por etapa (inspección, silencio, concatenación, codificación...)
+            row['stages'] = timings.stage_summary()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Medir el rendimiento de la inspección, importación, estimación y codificación.")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick',
+                        help="conjunto de archivos de prueba ('standard' añade archivos de 1 minuto; "
+                             "'full', de 10 minutos y de 3 horas)")
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), "mp3_bench_fixtures"),
+                        help="carpeta de los archivos de prueba (se reutilizan entre ejecuciones)")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), default=[],
+                        help="escenario de codificación a medir (repetible; por defecto, todos)")
+    parser.add_argument('--stages', default="probe,import,plan,encode",
+                        help="etapas a medir, separadas por comas")
+    parser.add_argument('--plan-rows', type=int, default=50000,
+                        help="filas de la lista en la etapa de estimación")
+    parser.add_argument('-j', '--jobs', type=int, default=default_worker_count(),
+                        help="trabajos simultáneos (por defecto, uno por núcleo)")
+    parser.add_argument('--label', default="", help="etiqueta de la ejecución (versión, rama...)")
+    parser.add_argument('--report', default="-",
+                        help="archivo donde escribir el informe JSON ('-' para la salida estándar)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    stages = {stage.strip() for stage in args.stages.split(',') if stage.strip()}
+    workers = max(1, args.jobs)
+
+    folder = os.path.join(args.fixtures, args.profile)
+    os.makedirs(folder, exist_ok=True)
+    specs = fixture_specs(args.profile)
+    print(f"Preparando {len(specs)} archivos de prueba en {folder}...", file=sys.stderr)
+    fixtures = [generate_fixture(spec, folder) for spec in specs]
+
+    results: List[Dict] = []
+    started = datetime.now()
+    with tempfile.TemporaryDirectory(prefix="mp3bench_") as state_dir:
+        if 'probe' in stages:
+            bench_probe(fixtures, results)
+        if 'import' in stages:
+            bench_import(folder, state_dir, workers, results)
+        if 'plan' in stages:
+            bench_plan(fixtures, max(1, args.plan_rows), results)
+        if 'encode' in stages:
+            bench_encode(fixtures, args.scenario or list(SCENARIOS), workers, results)
+
+    report = {
+        'label': args.label,
+        'started': started.isoformat(timespec='seconds'),
+        'profile': args.profile,
+        'jobs': workers,
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': NUMPY_AVAILABLE,
+            'ffmpeg': TOOLS.find('ffmpeg').version,
+            'ffmpeg_path': TOOLS.find('ffmpeg').path,
+        },
+        'fixtures': [dict(asdict(spec), filename=spec.filename, size=os.path.getsize(path))
+                     for spec, path in zip(specs, fixtures)],
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.report == "-":
+        print(text)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    return 0 if all(row['failed'] == 0 for row in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
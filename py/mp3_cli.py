@@ -0,0 +1,284 @@
+"""Modo por lotes sin interfaz gráfica
+
+Usa el mismo núcleo que la ventana (``mp3_core``) para procesar archivos
+desde la línea de comandos, por ejemplo en servidores o tareas programadas.
+No importa tkinter ni tkinterdnd2.
+
+Ejemplo:
+    python mp3_cli.py ./podcasts "extra/**/*.mp3" -o ./salida --start-ms 1500 --jobs 8
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from mp3_core import (ERROR_CLASSES, TOOLS, FileList, JobJournal, MP3Processor, ProbeCache, ProbeIndex,
+                      ProcessingOptions, RunTimings, ScanFilter, SilenceCache,
+                      common_directory, default_worker_count, scan_directory,
+                      summarize_results)
+
+
+def parse_bitrate_arg(value: str) -> str:
+    """Validar el bitrate indicado: original, vbr o un valor en kbps (128 o 128k)"""
+    value = value.strip().lower()
+    if value in ("original", "vbr"):
+        return value
+    number = value[:-1] if value.endswith('k') else value
+    if not number.isdigit() or int(number) <= 0:
+        raise argparse.ArgumentTypeError(f"bitrate no válido: {value}")
+    return f"{int(number)}k"
+
+
+def parse_size_arg(value: str) -> int:
+    """Convertir un tamaño (bytes o con sufijo K, M, G en base 1024) a bytes"""
+    text = value.strip().upper().rstrip('B').replace(',', '.')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    factor = units.get(text[-1:], 1)
+    if factor != 1:
+        text = text[:-1]
+    try:
+        size = int(float(text) * factor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"tamaño no válido: {value}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"tamaño no válido: {value}")
+    return size
+
+
+def iter_inputs(patterns: List[str], scan_filter: Optional[ScanFilter] = None) -> Iterator[str]:
+    """Expandir archivos, carpetas (recursivas) y patrones glob a rutas de MP3
+
+    Los filtros solo se aplican al recorrer carpetas.
+    """
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for path, _ in scan_directory(pattern, scan_filter):
+                yield path
+        elif os.path.isfile(pattern):
+            yield pattern
+        else:
+            for match in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(match) and match.lower().endswith('.mp3'):
+                    yield match
+
+
+def format_seconds(seconds: float) -> str:
+    """Formatear una duración como m:ss"""
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Añadir silencio y cambiar el bitrate de archivos MP3 sin interfaz gráfica.")
+    parser.add_argument('inputs', nargs='+',
+                        help="archivos, carpetas o patrones glob (entre comillas para '**')")
+    parser.add_argument('-o', '--output-dir', default="",
+                        help="carpeta de salida (por defecto, la del archivo original)")
+    parser.add_argument('--name-pattern', default="{filename}_editado",
+                        help="patrón de nombre de salida (mismas variables que en la ventana)")
+    parser.add_argument('--bitrate', type=parse_bitrate_arg, default="original",
+                        help="original, vbr o un bitrate en kbps (por ejemplo 128k)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--target-size', type=parse_size_arg, default=0,
+                        help="tamaño exacto de cada salida (por ejemplo 5M o 5242880); ignora --bitrate")
+    target.add_argument('--target-total', type=parse_size_arg, default=0,
+                        help="tamaño exacto de todo el lote, repartido según la duración")
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help="al recorrer carpetas, incluir solo los archivos que coincidan (repetible); "
+                             "sin '/' se compara el nombre, con '/' la ruta relativa ('*' no cruza "
+                             "carpetas, '**' sí)")
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help="al recorrer carpetas, omitir archivos y subcarpetas que coincidan "
+                             "(repetible, mismos patrones que --include)")
+    parser.add_argument('--min-size', type=parse_size_arg, default=0,
+                        help="omitir los archivos más pequeños que este tamaño")
+    parser.add_argument('--max-size', type=parse_size_arg, default=0,
+                        help="omitir los archivos más grandes que este tamaño")
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help="profundidad máxima de subcarpetas (0 = solo la carpeta indicada)")
+    parser.add_argument('--follow-symlinks', action='store_true',
+                        help="entrar en carpetas enlazadas simbólicamente")
+    parser.add_argument('--start-ms', type=int, default=0, help="silencio al inicio en milisegundos")
+    parser.add_argument('--end-ms', type=int, default=0, help="silencio al final en milisegundos")
+    parser.add_argument('--no-metadata', action='store_true', help="no preservar las etiquetas ID3")
+    parser.add_argument('--preserve-folders', action='store_true',
+                        help="mantener la estructura de carpetas en la salida")
+    parser.add_argument('--overwrite', action='store_true', help="sobrescribir archivos existentes")
+    parser.add_argument('--no-stream-copy', action='store_true',
+                        help="recodificar siempre, aunque se mantenga el bitrate original")
+    parser.add_argument('--no-native-splice', action='store_true',
+                        help="copiar las tramas con FFmpeg en lugar de empalmarlas directamente")
+    parser.add_argument('-j', '--jobs', type=int, default=default_worker_count(),
+                        help="trabajos de FFmpeg simultáneos (por defecto, uno por núcleo)")
+    parser.add_argument('--summary', default="-",
+                        help="archivo donde escribir el resumen JSON ('-' para la salida estándar)")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="omitir los archivos cuya salida anterior sigue al día con la misma configuración")
+    parser.add_argument('--resume', action='store_true',
+                        help="reanudar el mismo lote si se interrumpió (omite los archivos ya terminados)")
+    parser.add_argument('--fsync', action='store_true',
+                        help="forzar cada salida a disco antes de renombrarla a su nombre final")
+    parser.add_argument('--scratch-dir', default="",
+                        help="carpeta para archivos intermedios (por defecto /dev/shm o la temporal del sistema)")
+    parser.add_argument('--state-dir', default=".",
+                        help="carpeta del índice de metadatos y la caché de silencios")
+    parser.add_argument('--timings', default="",
+                        help="escribir los tiempos por etapa y archivo (.csv para CSV; si no, JSON)")
+    parser.add_argument('--trace', default="",
+                        help="escribir una traza de Chrome (trace_event) para chrome://tracing o Perfetto")
+    parser.add_argument('--histogram', action='store_true',
+                        help="mostrar al final un histograma de los tiempos de cada etapa")
+    parser.add_argument('--ffmpeg', default="",
+                        help="ruta de ffmpeg (por defecto, junto a la aplicación o en el PATH)")
+    parser.add_argument('--ffprobe', default="",
+                        help="ruta de ffprobe (por defecto, junto a la aplicación o en el PATH)")
+    parser.add_argument('-q', '--quiet', action='store_true', help="no mostrar el progreso")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    TOOLS.configure(ffmpeg=args.ffmpeg, ffprobe=args.ffprobe)
+
+    scan_filter = ScanFilter(
+        include=tuple(args.include),
+        exclude=tuple(args.exclude),
+        min_size=args.min_size,
+        max_size=args.max_size,
+        max_depth=args.max_depth,
+        follow_symlinks=args.follow_symlinks
+    )
+    files = FileList()
+    for path in iter_inputs(args.inputs, scan_filter):
+        files.add(path)
+    files = list(files)
+    if not files:
+        print("No se encontraron archivos MP3.", file=sys.stderr)
+        return 2
+
+    def log(message: str):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    state_dir = os.path.abspath(args.state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    index = ProbeIndex(os.path.join(state_dir, "mp3_editor_index.db"))
+    probe_cache = ProbeCache(index)
+    journal = JobJournal(os.path.join(state_dir, "mp3_editor_journal.db"))
+    silence_cache = SilenceCache(os.path.join(state_dir, "mp3_editor_cache", "silence"), 256 * 1024 * 1024)
+    processor = MP3Processor(probe_cache, silence_cache, lambda kind, message: log(f"[{kind}] {message}"))
+
+    options = ProcessingOptions(
+        silence_start=args.start_ms / 1000,
+        silence_end=args.end_ms / 1000,
+        bitrate=args.bitrate,
+        preserve_meta=not args.no_metadata,
+        output_folder=args.output_dir,
+        name_pattern=args.name_pattern,
+        overwrite=args.overwrite,
+        preserve_folders=args.preserve_folders,
+        common_dir=common_directory(files),
+        max_workers=max(1, args.jobs),
+        stream_copy=not args.no_stream_copy,
+        scratch_dir=args.scratch_dir,
+        fsync=args.fsync,
+        skip_unchanged=args.skip_unchanged,
+        target_size=args.target_size,
+        target_total=args.target_total,
+        native_splice=not args.no_native_splice
+    )
+    if options.output_folder:
+        os.makedirs(options.output_folder, exist_ok=True)
+
+    # Con el bitrate original las tramas se empalman sin FFmpeg; los archivos
+    # que no lo admitan fallarán uno a uno si falta
+    needs_ffmpeg = not (options.native_splice and options.stream_copy and options.bitrate == "original"
+                        and not options.target_size and not options.target_total)
+    ffmpeg = TOOLS.find('ffmpeg')
+    if not ffmpeg.available:
+        if needs_ffmpeg:
+            print("No se encontró FFmpeg (usa --ffmpeg para indicar su ruta).", file=sys.stderr)
+            return 2
+        log("FFmpeg no encontrado: solo se empalmarán las tramas, sin recodificar.")
+    elif not ffmpeg.has_libmp3lame:
+        if needs_ffmpeg:
+            print(f"FFmpeg ({ffmpeg.path}) no incluye el codificador libmp3lame.", file=sys.stderr)
+            return 2
+        log(f"FFmpeg ({ffmpeg.path}) no incluye libmp3lame: solo se empalmarán las tramas.")
+    else:
+        log(f"FFmpeg {ffmpeg.version}: {ffmpeg.path}")
+
+    # Ctrl+C cancela el lote y detiene los procesos de FFmpeg en curso
+    signal.signal(signal.SIGINT, lambda signum, frame: processor.cancel())
+
+    def on_result(result, done_count, total_files):
+        if result.skipped:
+            state = "ya hecho"
+        else:
+            state = "ok" if result.success else ("cancelado" if result.cancelled else "error")
+        if result.error_class:
+            state += f" ({ERROR_CLASSES[result.error_class]})"
+        log(f"\r({done_count}/{total_files}) {state}: {result.input_file}")
+
+    def on_progress(progress):
+        if args.quiet:
+            return
+        eta = progress['eta_seconds']
+        eta_text = f", quedan {format_seconds(eta)}" if eta is not None else ""
+        sys.stderr.write(f"\r{progress['percent']:5.1f}% ({progress['completed']}/{progress['total']}){eta_text}   ")
+        sys.stderr.flush()
+
+    timings = RunTimings() if args.timings or args.trace or args.histogram else None
+    started = datetime.now()
+    start_time = time.monotonic()
+    try:
+        results = processor.run_batch(files, options, on_result, on_progress,
+                                      journal, args.resume, timings)
+    finally:
+        index.close()
+        journal.close()
+
+    if timings:
+        if args.timings.lower().endswith('.csv'):
+            timings.write_csv(args.timings)
+        elif args.timings:
+            timings.write_json(args.timings)
+        if args.trace:
+            timings.write_chrome_trace(args.trace)
+        if args.histogram:
+            print(timings.histogram(), file=sys.stderr)
+
+    summary = summarize_results(results)
+    error_classes = {}
+    for result in results:
+        if result.error_class:
+            error_classes[result.error_class] = error_classes.get(result.error_class, 0) + 1
+    report = {
+        'started': started.isoformat(timespec='seconds'),
+        'elapsed_seconds': round(time.monotonic() - start_time, 3),
+        'options': asdict(options),
+        **summary,
+        'error_classes': error_classes,
+        **({'stages': timings.stage_summary()} if timings else {}),
+        'results': [asdict(result) for result in results]
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.summary == "-":
+        print(text)
+    else:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    return 0 if summary['failed'] == 0 and summary['cancelled'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
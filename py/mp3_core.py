@@ -0,0 +1,2689 @@
+"""Núcleo de procesamiento de MP3 Space Editor
+
+Contiene todo lo que no depende de la interfaz gráfica: inspección de
+archivos y cachés de metadatos, nombres de salida, selección de bitrate,
+silencio y codificación por lotes. Lo usan tanto la ventana de Tk como el
+modo por línea de comandos (``mp3_cli.py``), por lo que este módulo no debe
+importar tkinter.
+"""
+import csv
+import fnmatch
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import mp3_frames
+
+# NumPy es opcional: solo acelera la estimación de tamaños de listas grandes
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+@dataclass
+class ProcessingOptions:
+    """Copia de la configuración tomada en el hilo de Tk antes de procesar"""
+    silence_start: float = 0.0
+    silence_end: float = 0.0
+    bitrate: str = "original"
+    preserve_meta: bool = True
+    output_folder: str = ""
+    name_pattern: str = "{filename}_editado"
+    overwrite: bool = False
+    preserve_folders: bool = False
+    common_dir: str = ""
+    max_workers: int = 1
+    stream_copy: bool = True
+    scratch_dir: str = ""
+    fsync: bool = False
+    skip_unchanged: bool = False
+    target_size: int = 0   # Bytes exactos de cada salida (0 = desactivado)
+    target_total: int = 0  # Bytes exactos de todo el lote (0 = desactivado)
+    native_splice: bool = True  # Empalmar las tramas en Python, sin FFmpeg, si se puede
+
+
+@dataclass
+class JobResult:
+    """Resultado de procesar un archivo dentro de un lote"""
+    index: int
+    input_file: str
+    output_file: Optional[str] = None
+    success: bool = False
+    cancelled: bool = False
+    skipped: bool = False
+    error: str = ""
+    error_class: str = ""   # Tipo de error reconocido (ver ERROR_CLASSES)
+    stderr_tail: str = ""   # Últimas líneas de la salida de error de FFmpeg
+
+
+# Bytes leídos al principio y al final de un archivo para su identidad de contenido
+IDENTITY_BLOCK_SIZE = 64 * 1024
+
+# Prefijo de las carpetas temporales de cada trabajo
+SCRATCH_PREFIX = "mp3editor_"
+
+# Espacio libre mínimo para usar /dev/shm como carpeta temporal
+SCRATCH_MIN_FREE = 256 * 1024 * 1024
+
+# Las carpetas temporales más antiguas se consideran restos de ejecuciones fallidas
+SCRATCH_STALE_SECONDS = 24 * 3600
+
+# Margen de espacio libre exigido sobre el tamaño estimado de cada salida
+FREE_SPACE_MARGIN = 1024 * 1024
+
+
+def default_worker_count() -> int:
+    """Número de trabajos simultáneos por defecto (uno por núcleo)"""
+    return os.cpu_count() or 1
+
+
+@dataclass
+class ProbeInfo:
+    """Metadatos de un archivo obtenidos con una sola inspección"""
+    path: str
+    size: int
+    mtime_ns: int
+    duration: float = 0.0
+    bit_rate: int = 0
+    sample_rate: int = 0
+    channels: int = 0
+    channel_layout: str = ""
+    channel_mode: str = ""
+    vbr: bool = False
+    layer: int = 0
+    tags: Dict[str, str] = field(default_factory=dict)
+    source: str = "ffprobe"  # 'frames' si se leyó directamente de las tramas
+    tag_bytes: int = 0       # Bytes de etiquetas ID3v2 + ID3v1
+    
+    def tag(self, name: str, default: str = "Unknown") -> str:
+        """Obtener una etiqueta sin distinguir mayúsculas"""
+        return self.tags.get(name.lower(), default)
+
+
+def file_key(path: str) -> str:
+    """Clave normalizada de un archivo (ruta absoluta)"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def content_identity(path: str, size: int) -> str:
+    """Identidad de contenido: tamaño + hash del principio y del final
+    
+    Detecta el mismo archivo aunque se llegue a él por rutas distintas
+    (enlaces simbólicos, unidades mapeadas, copias).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(IDENTITY_BLOCK_SIZE))
+        if size > IDENTITY_BLOCK_SIZE:
+            f.seek(max(IDENTITY_BLOCK_SIZE, size - IDENTITY_BLOCK_SIZE))
+            digest.update(f.read(IDENTITY_BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+class FileRow:
+    """Fila de la lista de archivos
+    
+    Usa ``__slots__`` para que decenas de miles de filas ocupen poco: los
+    textos que se muestran se generan solo para las filas visibles.
+    """
+    __slots__ = ('path', 'size', 'info', 'probed', 'status', 'estimated')
+    
+    def __init__(self, path: str, size: int = 0):
+        self.path = path
+        self.size = size
+        self.info: Optional[ProbeInfo] = None
+        self.probed = False   # Ya se intentó leer sus metadatos
+        self.status = ""
+        self.estimated = -1   # Tamaño de salida estimado (-1 si no se sabe)
+
+
+# Claves de ordenación de la lista por columna
+SORT_KEYS: Dict[str, Callable[[FileRow], object]] = {
+    'filename': lambda row: os.path.basename(row.path).lower(),
+    'size': lambda row: row.size,
+    'estimated': lambda row: row.estimated,
+    'duration': lambda row: row.info.duration if row.info else -1.0,
+    'bitrate': lambda row: row.info.bit_rate if row.info else -1,
+    'status': lambda row: row.status,
+    'path': lambda row: (os.path.dirname(row.path).lower(), os.path.basename(row.path).lower()),
+}
+
+
+class FileList:
+    """Lista ordenada de archivos a procesar, sin duplicados
+    
+    Los archivos se indexan por su ruta absoluta normalizada, de modo que
+    comprobar si un archivo ya está en la lista es O(1). Opcionalmente
+    también se indexan por identidad de contenido. Cada archivo tiene una
+    ``FileRow`` con los datos que muestra la interfaz.
+    """
+    
+    def __init__(self):
+        self._files: Dict[str, FileRow] = {}  # Clave normalizada -> fila
+        self._identities: Dict[str, str] = {}  # Identidad de contenido -> clave
+    
+    def add(self, path: str, identity: Optional[str] = None, size: int = 0) -> bool:
+        """Añadir un archivo; devuelve False si ya estaba en la lista"""
+        key = file_key(path)
+        if key in self._files or (identity and identity in self._identities):
+            return False
+        self._files[key] = FileRow(path, size)
+        if identity:
+            self._identities[identity] = key
+        return True
+    
+    def clear(self):
+        self._files.clear()
+        self._identities.clear()
+    
+    def first(self) -> Optional[str]:
+        row = next(iter(self._files.values()), None)
+        return row.path if row else None
+    
+    def row(self, path: str) -> Optional[FileRow]:
+        """Fila de un archivo (None si no está en la lista)"""
+        return self._files.get(file_key(path))
+    
+    def rows(self) -> List[FileRow]:
+        """Todas las filas, en el orden en que se añadieron"""
+        return list(self._files.values())
+    
+    def sorted_rows(self, column: str, reverse: bool = False) -> List[FileRow]:
+        """Filas ordenadas por una columna de la lista"""
+        return sorted(self._files.values(), key=SORT_KEYS[column], reverse=reverse)
+    
+    def __contains__(self, path: str) -> bool:
+        return file_key(path) in self._files
+    
+    def __iter__(self):
+        return iter([row.path for row in self._files.values()])
+    
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+def match_path_glob(parts: List[str], pattern: List[str]) -> bool:
+    """Comparar una ruta relativa con un glob, ambos divididos por ``/``
+    
+    Cada segmento se compara con ``fnmatch``, así que ``*`` y ``?`` no pasan
+    de una carpeta a otra; un segmento ``**`` equivale a cualquier número de
+    carpetas (también ninguna).
+    """
+    if not pattern:
+        return not parts
+    if pattern[0] == '**':
+        return any(match_path_glob(parts[skip:], pattern[1:]) for skip in range(len(parts) + 1))
+    return bool(parts) and fnmatch.fnmatchcase(parts[0], pattern[0]) and \
+        match_path_glob(parts[1:], pattern[1:])
+
+
+@dataclass
+class ScanFilter:
+    """Filtros para recorrer carpetas en busca de archivos
+    
+    Los patrones ``include``/``exclude`` se comparan sin distinguir
+    mayúsculas. Un patrón sin ``/`` es un glob (``fnmatch``) del nombre; uno
+    con ``/`` se compara con la ruta relativa a la carpeta recorrida segmento
+    a segmento (ver ``match_path_glob``): ``directo/*`` no incluye las
+    subcarpetas de ``directo`` y ``directo/**`` sí. ``exclude`` también
+    descarta subcarpetas enteras. Un tamaño o profundidad 0/None significa
+    sin límite.
+    """
+    extensions: Tuple[str, ...] = ('.mp3',)
+    include: Tuple[str, ...] = ()
+    exclude: Tuple[str, ...] = ()
+    min_size: int = 0
+    max_size: int = 0
+    max_depth: Optional[int] = None  # 0 = solo la carpeta indicada
+    follow_symlinks: bool = False
+    
+    def __post_init__(self):
+        self.extensions = tuple(ext.lower() for ext in self.extensions)
+        self.include = tuple(pattern.lower() for pattern in self.include)
+        self.exclude = tuple(pattern.lower() for pattern in self.exclude)
+    
+    @staticmethod
+    def _matches(patterns: Tuple[str, ...], name: str, relative: str) -> bool:
+        parts = relative.split('/')
+        return any(match_path_glob(parts, pattern.strip('/').split('/')) if '/' in pattern
+                   else fnmatch.fnmatchcase(name, pattern)
+                   for pattern in patterns)
+    
+    def accepts_name(self, name: str, relative: str) -> bool:
+        """Comprobar extensión y patrones de un archivo (sin mirar el tamaño)"""
+        name = name.lower()
+        relative = relative.lower()
+        if not name.endswith(self.extensions):
+            return False
+        if self.include and not self._matches(self.include, name, relative):
+            return False
+        return not self._matches(self.exclude, name, relative)
+    
+    def accepts_size(self, size: int) -> bool:
+        return size >= self.min_size and (not self.max_size or size <= self.max_size)
+    
+    def accepts_dir(self, name: str, relative: str) -> bool:
+        """Comprobar si hay que entrar en una subcarpeta"""
+        return not self._matches(self.exclude, name.lower(), relative.lower())
+
+
+def scan_directory(root: str, scan_filter: Optional[ScanFilter] = None,
+                   cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, int]]:
+    """Recorrer una carpeta devolviendo ``(ruta, tamaño)`` según se encuentran
+    
+    Recorre el árbol en una sola pasada con ``os.scandir`` (sin listar
+    primero todo el árbol), de modo que los primeros resultados llegan de
+    inmediato. Las carpetas ya visitadas se recuerdan por ``(st_dev,
+    st_ino)`` para no entrar en bucles de enlaces simbólicos. Las carpetas
+    sin permiso se omiten.
+    """
+    scan_filter = scan_filter or ScanFilter()
+    visited: Set[Tuple[int, int]] = set()
+    stack = [(root, "", 0)]
+    
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return
+        directory, relative, depth = stack.pop()
+        try:
+            stat = os.stat(directory)
+            if (stat.st_dev, stat.st_ino) in visited:
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=scan_filter.follow_symlinks):
+                    if ((scan_filter.max_depth is None or depth < scan_filter.max_depth)
+                            and scan_filter.accepts_dir(entry.name, entry_relative)):
+                        subdirs.append((entry.path, entry_relative, depth + 1))
+                    continue
+                if not scan_filter.accepts_name(entry.name, entry_relative):
+                    continue
+                if not entry.is_file():
+                    continue
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            if scan_filter.accepts_size(size):
+                yield entry.path, size
+        
+        # Las subcarpetas se recorren en orden alfabético
+        stack.extend(reversed(subdirs))
+
+
+def iter_sources(sources: List[str], scan_filter: Optional[ScanFilter] = None,
+                 cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, int]]:
+    """Expandir archivos y carpetas a ``(ruta, tamaño)`` de los MP3 encontrados
+    
+    Los archivos indicados explícitamente solo se comprueban por extensión.
+    """
+    scan_filter = scan_filter or ScanFilter()
+    for source in sources:
+        if cancel is not None and cancel.is_set():
+            return
+        if os.path.isdir(source):
+            yield from scan_directory(source, scan_filter, cancel)
+        elif os.path.isfile(source) and source.lower().endswith(scan_filter.extensions):
+            try:
+                yield source, os.path.getsize(source)
+            except OSError:
+                continue
+
+
+def free_space(directory: str) -> Optional[int]:
+    """Bytes libres en el disco de una carpeta (None si no se puede saber)"""
+    try:
+        return shutil.disk_usage(directory).free
+    except OSError:
+        return None
+
+
+def has_free_space(directory: str, needed: int) -> bool:
+    """Comprobar que una carpeta tiene sitio para ``needed`` bytes más el margen"""
+    free = free_space(directory)
+    return free is None or free >= needed + FREE_SPACE_MARGIN
+
+
+def partial_output_path(output_file: str) -> str:
+    """Nombre temporal junto al destino (mismo sistema de archivos)
+    
+    Empieza por punto y termina en ``.part`` para que los vigilantes de
+    carpetas lo ignoren hasta que se renombra.
+    """
+    directory, name = os.path.split(output_file)
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
+
+
+def commit_output(temp_file: str, output_file: str, fsync: bool = False):
+    """Mover un archivo terminado a su nombre definitivo de forma atómica"""
+    if fsync:
+        with open(temp_file, 'rb') as f:
+            os.fsync(f.fileno())
+    
+    os.replace(temp_file, output_file)
+    
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # Persistir también la entrada del directorio (solo POSIX)
+        dir_fd = os.open(os.path.dirname(output_file) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def scratch_directory(preferred: str = "") -> str:
+    """Elegir la carpeta para archivos intermedios
+    
+    Se usa ``preferred`` si se indica; si no, ``/dev/shm`` (en memoria)
+    cuando existe y tiene sitio, y como último recurso la carpeta temporal
+    del sistema. Nunca se escribe junto a los archivos de entrada.
+    """
+    if preferred:
+        os.makedirs(preferred, exist_ok=True)
+        return preferred
+    
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        free = free_space(shm)
+        if free is not None and free >= SCRATCH_MIN_FREE:
+            return shm
+    return tempfile.gettempdir()
+
+
+def cleanup_stale_scratch(directory: str, max_age: float = SCRATCH_STALE_SECONDS):
+    """Eliminar carpetas temporales abandonadas por ejecuciones interrumpidas"""
+    limit = time.time() - max_age
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if (entry.name.startswith(SCRATCH_PREFIX) and entry.is_dir(follow_symlinks=False)
+                            and entry.stat(follow_symlinks=False).st_mtime < limit):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+
+
+# Versión mínima de FFmpeg: adelay con all=1 y apad con pad_dur (4.2)
+MIN_FFMPEG_VERSION = (4, 2)
+
+
+def subprocess_flags() -> Dict:
+    """Opciones para lanzar herramientas sin abrir una consola en Windows"""
+    if platform.system() == "Windows":
+        return {'creationflags': subprocess.CREATE_NO_WINDOW}
+    return {}
+
+
+@dataclass
+class ToolInfo:
+    """Herramienta externa localizada (ffmpeg o ffprobe)"""
+    name: str
+    path: str = ""          # Ruta absoluta ('' si no se encontró)
+    version: str = ""       # Texto de versión, p. ej. "6.1.1" o "N-113000-g..."
+    has_libmp3lame: bool = False
+    
+    @property
+    def available(self) -> bool:
+        return bool(self.path)
+    
+    @property
+    def version_tuple(self) -> Optional[Tuple[int, int]]:
+        """(mayor, menor) de una versión publicada; None en compilaciones de git"""
+        match = re.match(r'n?(\d+)\.(\d+)', self.version)
+        return (int(match.group(1)), int(match.group(2))) if match else None
+    
+    @property
+    def supported(self) -> bool:
+        version = self.version_tuple
+        return self.available and (version is None or version >= MIN_FFMPEG_VERSION)
+
+
+class ToolLocator:
+    """Localiza ffmpeg y ffprobe una sola vez y recuerda el resultado
+    
+    Orden de búsqueda: ruta configurada, carpeta de la aplicación (y la del
+    ejecutable si está empaquetada), carpeta actual y ``PATH``. De ffmpeg se
+    comprueba además la versión y que tenga el codificador libmp3lame. Los
+    procesos se lanzan después con la ruta absoluta, sin pasar por un shell.
+    """
+    
+    def __init__(self, configured: Optional[Dict[str, str]] = None):
+        self.configured = dict(configured or {})
+        self._tools: Dict[str, ToolInfo] = {}
+        self._lock = threading.Lock()
+    
+    def configure(self, **paths: str):
+        """Cambiar las rutas configuradas (``ffmpeg=...``, ``ffprobe=...``) y olvidar lo resuelto"""
+        with self._lock:
+            self.configured.update(paths)
+            self._tools.clear()
+    
+    def search_dirs(self) -> List[str]:
+        """Carpetas donde buscar una copia incluida con la aplicación"""
+        dirs = [os.path.dirname(os.path.abspath(__file__))]
+        if getattr(sys, 'frozen', False):
+            dirs.append(os.path.dirname(sys.executable))
+        dirs.append(os.getcwd())
+        return list(dict.fromkeys(dirs))
+    
+    def resolve(self, name: str) -> str:
+        """Ruta absoluta de una herramienta ('' si no se encuentra)"""
+        exe_names = [name + ".exe", name] if platform.system() == "Windows" else [name]
+        
+        configured = self.configured.get(name, "")
+        if configured:
+            if os.path.isdir(configured):
+                candidates = [os.path.join(configured, exe) for exe in exe_names]
+            else:
+                candidates = [configured]
+            for candidate in candidates:
+                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                    return os.path.abspath(candidate)
+        
+        for directory in self.search_dirs():
+            for exe in exe_names:
+                candidate = os.path.join(directory, exe)
+                if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                    return candidate
+        return shutil.which(name) or ""
+    
+    def find(self, name: str) -> ToolInfo:
+        """Información de una herramienta, resuelta la primera vez que se pide"""
+        with self._lock:
+            info = self._tools.get(name)
+            if info is None:
+                info = self._inspect(name)
+                self._tools[name] = info
+            return info
+    
+    def path(self, name: str) -> str:
+        """Ruta para lanzar una herramienta (su nombre si no se encontró)"""
+        return self.find(name).path or name
+    
+    def _inspect(self, name: str) -> ToolInfo:
+        info = ToolInfo(name, self.resolve(name))
+        if not info.available:
+            return info
+        try:
+            result = subprocess.run([info.path, '-hide_banner', '-version'],
+                                    capture_output=True, text=True, errors='replace',
+                                    timeout=30, **subprocess_flags())
+            match = re.search(r'version (\S+)', result.stdout)
+            info.version = match.group(1) if match else ""
+            if name == 'ffmpeg':
+                result = subprocess.run([info.path, '-hide_banner', '-encoders'],
+                                        capture_output=True, text=True, errors='replace',
+                                        timeout=30, **subprocess_flags())
+                info.has_libmp3lame = 'libmp3lame' in result.stdout
+        except (OSError, subprocess.SubprocessError):
+            info.path = ""
+        return info
+
+
+# Localizador compartido por todo el programa
+TOOLS = ToolLocator()
+
+
+def run_ffprobe(path: str, stat: os.stat_result) -> Optional[ProbeInfo]:
+    """Inspeccionar un archivo con ffprobe y devolver sus metadatos"""
+    ffprobe = TOOLS.find('ffprobe')
+    if not ffprobe.available:
+        return None
+    cmd = [ffprobe.path, '-v', 'quiet', '-print_format', 'json',
+           '-show_format', '-show_streams', path]
+    
+    result = subprocess.run(cmd, capture_output=True, text=True, errors='replace',
+                            **subprocess_flags())
+    if result.returncode != 0:
+        return None
+    
+    info = json.loads(result.stdout)
+    format_info = info.get('format', {})
+    audio = next((s for s in info.get('streams', []) if s.get('codec_type') == 'audio'), {})
+    
+    return ProbeInfo(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        duration=float(format_info.get('duration', 0) or 0),
+        bit_rate=int(format_info.get('bit_rate', 0) or 0),
+        sample_rate=int(audio.get('sample_rate', 0) or 0),
+        channels=int(audio.get('channels', 0) or 0),
+        channel_layout=audio.get('channel_layout', ''),
+        tags={k.lower(): v for k, v in format_info.get('tags', {}).items()}
+    )
+
+
+def scan_frames(path: str, stat: os.stat_result) -> ProbeInfo:
+    """Obtener los metadatos leyendo las cabeceras de trama (sin subprocesos)"""
+    stream = mp3_frames.scan_file(path)
+    return ProbeInfo(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        duration=stream.duration,
+        bit_rate=stream.bit_rate,
+        sample_rate=stream.sample_rate,
+        channels=stream.channels,
+        channel_layout='mono' if stream.channels == 1 else 'stereo',
+        channel_mode=stream.channel_mode,
+        vbr=stream.vbr,
+        layer=stream.layer,
+        tags=stream.tags,
+        source='frames',
+        tag_bytes=stream.id3v2_size + (128 if stream.has_id3v1 else 0)
+    )
+
+
+def probe_file(path: str, stat: os.stat_result) -> Optional[ProbeInfo]:
+    """Inspeccionar un archivo: primero por tramas y, si falla, con ffprobe"""
+    try:
+        return scan_frames(path, stat)
+    except (mp3_frames.Mp3FormatError, OSError, ValueError):
+        # Archivo dañado o con una estructura que el lector no entiende
+        return run_ffprobe(path, stat)
+
+
+class ProbeIndex:
+    """Índice persistente (SQLite) de metadatos entre sesiones
+    
+    Las entradas se identifican por ruta absoluta, tamaño y fecha de
+    modificación. Cuando se supera ``max_entries`` se eliminan las menos
+    usadas recientemente. Las escrituras se agrupan y se confirman en una
+    sola transacción con ``flush``.
+    """
+    
+    FLUSH_EVERY = 256
+    
+    # Versión del contenido de las entradas: al subirla se descartan las
+    # guardadas por versiones anteriores del analizador
+    SCHEMA_VERSION = 2
+    
+    def __init__(self, db_path: str, max_entries: int = 100000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending_puts: Dict[str, Tuple] = {}
+        self._pending_touches: Set[str] = set()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS probes_last_used ON probes(last_used)")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version < self.SCHEMA_VERSION:
+            # El bitrate de los CBR de LAME se leía de la trama Info
+            self._conn.execute("DELETE FROM probes")
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._conn.commit()
+    
+    def load_all(self) -> List[ProbeInfo]:
+        """Cargar todas las entradas de una vez (al iniciar)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM probes").fetchall()
+        entries = []
+        for (data,) in rows:
+            try:
+                entries.append(ProbeInfo(**json.loads(data)))
+            except (TypeError, ValueError):
+                pass
+        return entries
+    
+    def get(self, key: str, size: int, mtime_ns: int) -> Optional[ProbeInfo]:
+        """Buscar la entrada de un archivo si sigue al día (mismo tamaño y fecha)"""
+        with self._lock:
+            pending = self._pending_puts.get(key)
+            if pending:
+                row = pending[1:4]
+            else:
+                row = self._conn.execute(
+                    "SELECT size, mtime_ns, data FROM probes WHERE path = ?", (key,)).fetchone()
+        if not row or row[0] != size or row[1] != mtime_ns:
+            return None
+        try:
+            return ProbeInfo(**json.loads(row[2]))
+        except (TypeError, ValueError):
+            return None
+    
+    def put(self, key: str, info: ProbeInfo):
+        """Guardar (de forma diferida) los metadatos de un archivo"""
+        with self._lock:
+            self._pending_puts[key] = (key, info.size, info.mtime_ns,
+                                       json.dumps(asdict(info)), time.time())
+            pending = len(self._pending_puts) + len(self._pending_touches)
+        if pending >= self.FLUSH_EVERY:
+            self.flush()
+    
+    def touch(self, key: str):
+        """Marcar una entrada como usada recientemente"""
+        with self._lock:
+            self._pending_touches.add(key)
+    
+    def flush(self):
+        """Escribir los cambios pendientes y aplicar el límite de tamaño"""
+        with self._lock:
+            puts = list(self._pending_puts.values())
+            touches = [(time.time(), key) for key in self._pending_touches]
+            self._pending_puts.clear()
+            self._pending_touches.clear()
+            if not puts and not touches:
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO probes (path, size, mtime_ns, data, last_used)"
+                        " VALUES (?, ?, ?, ?, ?)", puts)
+                    self._conn.executemany(
+                        "UPDATE probes SET last_used = ? WHERE path = ?", touches)
+                    self._conn.execute(
+                        "DELETE FROM probes WHERE path IN ("
+                        " SELECT path FROM probes ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,))
+            except sqlite3.Error as e:
+                print(f"Error guardando el índice de metadatos: {e}")
+    
+    def clear(self):
+        """Eliminar todas las entradas del índice"""
+        with self._lock:
+            self._pending_puts.clear()
+            self._pending_touches.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM probes")
+            self._conn.execute("VACUUM")
+    
+    def close(self):
+        """Guardar cambios pendientes y cerrar la base de datos"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+class JobJournal:
+    """Registro persistente (SQLite) de los trabajos de cada lote
+    
+    Un lote se identifica por la lista ordenada de entradas y por la
+    configuración que afecta al resultado. Para cada trabajo se guarda la
+    huella del archivo de entrada (tamaño y fecha), la ruta de salida ya
+    resuelta y su estado, de modo que un lote interrumpido pueda reanudarse
+    sin repetir lo terminado ni crear sufijos ``_1``, ``_2``...
+    
+    Además mantiene un manifiesto de salidas por archivo y configuración,
+    que permite omitir en ejecuciones posteriores las entradas que no han
+    cambiado desde que se generó su salida.
+    """
+    
+    # Opciones que no cambian el archivo generado
+    RUNTIME_FIELDS = ('max_workers', 'scratch_dir', 'fsync', 'skip_unchanged')
+    
+    # Opciones que dependen del lote y no del archivo (no cuentan para el manifiesto)
+    BATCH_FIELDS = ('common_dir', 'overwrite')
+    
+    # Lotes terminados que se conservan como historial
+    KEEP_BATCHES = 20
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            " id TEXT PRIMARY KEY,"
+            " settings TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " batch_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " input_file TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " output_file TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error TEXT NOT NULL DEFAULT '',"
+            " PRIMARY KEY (batch_id, idx))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outputs ("
+            " input_key TEXT NOT NULL,"
+            " settings TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " identity TEXT NOT NULL,"
+            " output_file TEXT NOT NULL,"
+            " output_fingerprint TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (input_key, settings))")
+        self._conn.commit()
+    
+    @staticmethod
+    def fingerprint(path: str) -> Optional[str]:
+        """Huella barata de un archivo de entrada (None si no existe)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    
+    @classmethod
+    def settings_hash(cls, options: ProcessingOptions, per_file: bool = False) -> str:
+        """Resumen de las opciones que afectan a la salida
+        
+        Con ``per_file`` se ignoran también las opciones propias del lote,
+        para comparar un archivo con salidas generadas en otros lotes.
+        """
+        excluded = cls.RUNTIME_FIELDS + (cls.BATCH_FIELDS if per_file else ())
+        settings = {k: v for k, v in asdict(options).items() if k not in excluded}
+        data = json.dumps(settings, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+    
+    @classmethod
+    def batch_id(cls, files: List[str], options: ProcessingOptions) -> str:
+        """Identificador estable de un lote"""
+        digest = hashlib.sha1(cls.settings_hash(options).encode('ascii'))
+        for path in files:
+            digest.update(file_key(path).encode('utf-8', 'surrogateescape'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def load(self, batch_id: str) -> Dict[int, Tuple[str, str, str, str]]:
+        """Trabajos registrados de un lote: índice -> (entrada, huella, salida, estado)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, input_file, fingerprint, output_file, status FROM jobs"
+                " WHERE batch_id = ?", (batch_id,)).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+    
+    def progress(self, batch_id: str) -> Tuple[int, int]:
+        """(terminados, total) de un lote registrado"""
+        with self._lock:
+            done, total = self._conn.execute(
+                "SELECT COALESCE(SUM(status = 'done'), 0), COUNT(*) FROM jobs WHERE batch_id = ?",
+                (batch_id,)).fetchone()
+        return done, total
+    
+    def start(self, batch_id: str, options: ProcessingOptions,
+              jobs: List[Tuple[int, str, str, str, str]]):
+        """Registrar (o volver a registrar) todos los trabajos de un lote
+        
+        ``jobs`` contiene tuplas (índice, entrada, huella, salida, estado).
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE batch_id = ?", (batch_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches (id, settings, created, updated) VALUES (?, ?, ?, ?)",
+                (batch_id, json.dumps(asdict(options), ensure_ascii=False), now, now))
+            self._conn.executemany(
+                "INSERT INTO jobs (batch_id, idx, input_file, fingerprint, output_file, status)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(batch_id,) + job for job in jobs])
+            # Olvidar los lotes más antiguos
+            self._conn.execute(
+                "DELETE FROM jobs WHERE batch_id IN ("
+                " SELECT id FROM batches ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.KEEP_BATCHES,))
+            self._conn.execute(
+                "DELETE FROM batches WHERE id IN ("
+                " SELECT id FROM batches ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                (self.KEEP_BATCHES,))
+    
+    def mark(self, batch_id: str, index: int, status: str, error: str = ""):
+        """Actualizar el estado de un trabajo (se confirma de inmediato)"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ? WHERE batch_id = ? AND idx = ?",
+                    (status, error, batch_id, index))
+                self._conn.execute("UPDATE batches SET updated = ? WHERE id = ?",
+                                   (time.time(), batch_id))
+        except sqlite3.Error as e:
+            print(f"Error guardando el registro de trabajos: {e}")
+    
+    def load_manifest(self, settings: str) -> Dict[str, Tuple[str, str, str, str]]:
+        """Salidas registradas con una configuración: clave -> (huella, identidad, salida, huella de salida)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT input_key, fingerprint, identity, output_file, output_fingerprint"
+                " FROM outputs WHERE settings = ?", (settings,)).fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+    
+    def is_current(self, entry: Optional[Tuple[str, str, str, str]], input_file: str,
+                   fingerprint: str) -> bool:
+        """Indicar si la salida registrada en el manifiesto sigue al día"""
+        if not entry:
+            return False
+        recorded, identity, output_file, output_fingerprint = entry
+        if self.fingerprint(output_file) != output_fingerprint:
+            # La salida se borró o se modificó después de generarla
+            return False
+        if recorded == fingerprint:
+            return True
+        
+        # Mismo tamaño pero otra fecha (copiado o "tocado"): comparar contenido
+        size = int(fingerprint.split(':', 1)[0])
+        if identity and size == int(recorded.split(':', 1)[0]):
+            try:
+                return content_identity(input_file, size) == identity
+            except OSError:
+                return False
+        return False
+    
+    def record_output(self, input_file: str, settings: str, fingerprint: str, output_file: str):
+        """Registrar en el manifiesto la salida recién generada de un archivo"""
+        output_fingerprint = self.fingerprint(output_file)
+        if not fingerprint or not output_fingerprint:
+            return
+        try:
+            identity = content_identity(input_file, int(fingerprint.split(':', 1)[0]))
+        except OSError:
+            identity = ""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outputs (input_key, settings, fingerprint, identity,"
+                    " output_file, output_fingerprint, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (file_key(input_file), settings, fingerprint, identity,
+                     output_file, output_fingerprint, time.time()))
+        except sqlite3.Error as e:
+            print(f"Error guardando el manifiesto de salidas: {e}")
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SilenceCache:
+    """Caché en disco de silencios ya codificados
+    
+    Cada combinación de frecuencia, canales, bitrate (o VBR) y duración se
+    codifica una sola vez y se reutiliza en todo el lote y entre sesiones.
+    El directorio tiene un tamaño máximo; al superarlo se eliminan los
+    archivos usados hace más tiempo.
+    """
+    
+    # Los archivos usados recientemente no se eliminan (pueden estar en uso)
+    EVICT_GRACE_SECONDS = 300
+    
+    # Prefijo de los nombres; cambia cuando cambia lo que se guarda con cada
+    # clave (v2: el bitrate de los CBR de LAME se leía de la trama Info)
+    NAME_PREFIX = "silence_v2_"
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        os.makedirs(directory, exist_ok=True)
+    
+    def get(self, sample_rate: int, channels: int, bitrate: int, duration: float,
+            encode) -> Optional[str]:
+        """Devolver un silencio codificado, creándolo con ``encode(ruta)`` si falta
+        
+        ``bitrate`` es 0 para silencios VBR.
+        """
+        millis = int(round(duration * 1000))
+        quality = f"{bitrate // 1000}k" if bitrate else "vbr"
+        name = f"{self.NAME_PREFIX}{sample_rate}_{channels}ch_{quality}_{millis}ms.mp3"
+        path = os.path.join(self.directory, name)
+        
+        with self._lock:
+            key_lock = self._key_locks.setdefault(name, threading.Lock())
+        
+        with key_lock:
+            if os.path.exists(path):
+                # Marcar como usado recientemente
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                return path
+            
+            # Codificar en un nombre temporal y renombrar al terminar
+            temp_path = os.path.join(self.directory, f".{name}.{uuid.uuid4().hex}.tmp")
+            try:
+                if not encode(temp_path):
+                    return None
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+        
+        self.evict()
+        return path
+    
+    def evict(self):
+        """Eliminar los silencios menos usados hasta respetar el tamaño máximo
+        
+        Los de versiones anteriores de la clave no se vuelven a usar y se
+        eliminan antes que los demás.
+        """
+        with self._lock:
+            try:
+                entries = []
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if entry.is_file() and entry.name.endswith('.mp3'):
+                            stat = entry.stat()
+                            current = entry.name.startswith(self.NAME_PREFIX)
+                            entries.append((current, stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                return
+            
+            total = sum(size for _, _, size, _ in entries)
+            limit = time.time() - self.EVICT_GRACE_SECONDS
+            for current, mtime, size, path in sorted(entries):
+                if current and total <= self.max_bytes:
+                    break
+                if mtime > limit:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+
+class ProbeCache:
+    """Caché de metadatos compartida por la lista, los nombres y los cálculos
+    
+    Cada archivo se inspecciona una sola vez (leyendo las tramas o, si no es
+    posible, con ffprobe); la entrada se invalida cuando
+    cambian la ruta, el tamaño o la fecha de modificación. Si se indica un
+    ``ProbeIndex``, los resultados también se conservan entre sesiones.
+    """
+    
+    def __init__(self, index: Optional[ProbeIndex] = None):
+        self._entries: Dict[str, ProbeInfo] = {}
+        self._lock = threading.Lock()
+        self.index = index
+        
+        # Cargar el índice persistente de una vez
+        if index:
+            for info in index.load_all():
+                self._entries[file_key(info.path)] = info
+    
+    def get(self, path: str) -> Optional[ProbeInfo]:
+        """Devolver los metadatos de un archivo, inspeccionándolo si hace falta"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        
+        key = file_key(path)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+            if self.index:
+                self.index.touch(key)
+            return cached
+        
+        # Tras ``clear`` la memoria está vacía, pero el índice sigue al día
+        if self.index:
+            stored = self.index.get(key, stat.st_size, stat.st_mtime_ns)
+            if stored:
+                with self._lock:
+                    self._entries[key] = stored
+                self.index.touch(key)
+                return stored
+        
+        try:
+            info = probe_file(path, stat)
+        except Exception as e:
+            print(f"Error obteniendo metadatos: {e}")
+            info = None
+        
+        if info:
+            with self._lock:
+                self._entries[key] = info
+            if self.index:
+                self.index.put(key, info)
+        return info
+    
+    def invalidate(self, path: str):
+        """Descartar la entrada de un archivo"""
+        with self._lock:
+            self._entries.pop(file_key(path), None)
+    
+    def clear(self):
+        """Vaciar la caché en memoria (el índice persistente se conserva)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def rebuild(self):
+        """Vaciar la caché y el índice persistente"""
+        self.clear()
+        if self.index:
+            self.index.clear()
+    
+    def flush(self):
+        """Guardar en disco los resultados pendientes"""
+        if self.index:
+            self.index.flush()
+
+
+# Últimos bytes de la salida de error de FFmpeg que se guardan por proceso
+STDERR_TAIL_BYTES = 16 * 1024
+
+# Longitud máxima de una línea de error (las más largas se cortan)
+STDERR_LINE_LIMIT = 2048
+
+# Tipos de error reconocidos en la salida de FFmpeg, por orden de prioridad
+ERROR_CLASSES = {
+    'disk_full': "disco lleno",
+    'permission': "permiso denegado",
+    'unsupported_layout': "formato de canales o frecuencia no admitido",
+    'corrupt_input': "archivo de entrada dañado",
+    'missing_input': "archivo no encontrado",
+    'tool_missing': "FFmpeg no encontrado",
+    'target_too_small': "tamaño objetivo demasiado pequeño",
+    'target_unreachable': "no se pudo ajustar al tamaño objetivo",
+}
+
+# Marcas de cada tipo de error en minúsculas; una marca con varias partes
+# exige que aparezcan todas. Se buscan como subcadenas (mucho más rápido
+# que expresiones regulares sin distinguir mayúsculas en cada línea).
+ERROR_MARKERS = [
+    ('disk_full', ('no space left on device', 'enospc', 'disk quota exceeded')),
+    ('permission', ('permission denied', 'access is denied', 'eacces')),
+    ('unsupported_layout', ('unsupported channel layout', 'invalid channel layout',
+                            'unsupported sample rate', 'unsupported number of channels',
+                            ('channel layout', 'not supported'), ('sample rate', 'not supported'))),
+    ('corrupt_input', ('header missing', 'invalid data found when processing input',
+                       'invalid frame', 'error while decoding', 'corrupt', 'big_values',
+                       'overread', 'failed to read frame', 'could not find codec parameters',
+                       'failed to find two consecutive mpeg audio frames')),
+    ('missing_input', ('no such file or directory',)),
+]
+
+
+def classify_error(text: str) -> str:
+    """Tipo de error más importante que aparece en un texto ('' si ninguno)"""
+    text = text.lower()
+    for error_class, markers in ERROR_MARKERS:
+        for marker in markers:
+            if isinstance(marker, str):
+                if marker in text:
+                    return error_class
+            elif all(part in text for part in marker):
+                return error_class
+    return ""
+
+
+class StderrTail:
+    """Salida de error de un proceso con memoria acotada
+    
+    Guarda solo las últimas líneas hasta ``max_bytes`` (búfer circular),
+    pero clasifica todas las líneas a medida que llegan, así que un error
+    reconocido no se pierde aunque FFmpeg siga escribiendo después.
+    """
+    
+    def __init__(self, max_bytes: int = STDERR_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.lines: deque = deque()
+        self.size = 0
+        self.classes: Set[str] = set()
+    
+    def feed(self, line: str):
+        """Añadir una línea"""
+        line = line.rstrip('\r\n')
+        if not line:
+            return
+        error_class = classify_error(line)
+        if error_class:
+            self.classes.add(error_class)
+        self.lines.append(line)
+        self.size += len(line) + 1
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft()) + 1
+    
+    def drain(self, stream):
+        """Leer un flujo de texto hasta el final (pensado para un hilo aparte)"""
+        for line in iter(lambda: stream.readline(STDERR_LINE_LIMIT), ''):
+            self.feed(line)
+    
+    @property
+    def error_class(self) -> str:
+        """Tipo de error más importante visto en toda la salida"""
+        for error_class, _ in ERROR_MARKERS:
+            if error_class in self.classes:
+                return error_class
+        return ""
+    
+    def text(self) -> str:
+        return "\n".join(self.lines)
+    
+    def last_line(self) -> str:
+        return self.lines[-1] if self.lines else ""
+
+
+# Archivos cortos (segundos): se procesan varios por invocación de FFmpeg,
+# porque para ellos lanzar el proceso cuesta más que el propio trabajo
+SMALL_FILE_SECONDS = 30.0
+GROUP_MAX_FILES = 16
+
+# Intervalo mínimo entre avisos de progreso (para no saturar la interfaz)
+PROGRESS_INTERVAL = 0.25
+
+
+def parse_progress(fields: Dict[str, str]) -> Tuple[float, Optional[float]]:
+    """Interpretar un bloque de ``-progress`` de FFmpeg: (segundos, velocidad)"""
+    seconds = 0.0
+    for key in ('out_time_us', 'out_time_ms'):
+        # out_time_ms también está en microsegundos (nombre histórico)
+        value = fields.get(key, '')
+        if value.lstrip('-').isdigit():
+            seconds = max(0.0, int(value) / 1000000)
+            break
+    
+    speed = None
+    raw_speed = fields.get('speed', '').rstrip('x').strip()
+    try:
+        speed = float(raw_speed)
+    except ValueError:
+        pass
+    return seconds, speed
+
+
+class BatchProgress:
+    """Progreso agregado de un lote, ponderado por la duración de cada archivo
+    
+    Cada trabajo informa de los segundos de audio ya escritos; el total y la
+    estimación de tiempo restante se calculan sobre la duración esperada de
+    todo el lote. Los avisos se limitan a uno cada ``PROGRESS_INTERVAL``.
+    """
+    
+    def __init__(self, expected: Dict[int, float], files: List[str],
+                 callback: Callable[[Dict], None], interval: float = PROGRESS_INTERVAL):
+        self.expected = expected
+        self.files = files
+        self.callback = callback
+        self.interval = interval
+        self.total_seconds = sum(expected.values()) or 1.0
+        self.done: Dict[int, float] = {}
+        self.completed = 0
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+    
+    def update(self, index: int, seconds: float, speed: Optional[float] = None):
+        """Registrar el avance de un trabajo"""
+        with self._lock:
+            self.done[index] = min(seconds, self.expected.get(index, seconds))
+            now = time.monotonic()
+            if now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            snapshot = self._snapshot(index, seconds, speed, now)
+        self.callback(snapshot)
+    
+    def finish(self, index: int):
+        """Marcar un trabajo como terminado (con o sin éxito)"""
+        with self._lock:
+            self.done[index] = self.expected.get(index, 0.0)
+            self.completed += 1
+            now = time.monotonic()
+            self._last_emit = now
+            snapshot = self._snapshot(index, self.done[index], None, now)
+        self.callback(snapshot)
+    
+    def _snapshot(self, index: int, seconds: float, speed: Optional[float], now: float) -> Dict:
+        done_seconds = sum(self.done.values())
+        elapsed = now - self.started
+        rate = done_seconds / elapsed if elapsed > 0 else 0.0
+        remaining = self.total_seconds - done_seconds
+        file_duration = self.expected.get(index, 0.0)
+        return {
+            'index': index,
+            'input_file': self.files[index],
+            'file_seconds': seconds,
+            'file_duration': file_duration,
+            'file_percent': min(100.0, 100.0 * seconds / file_duration) if file_duration else 0.0,
+            'speed': speed,
+            'done_seconds': done_seconds,
+            'total_seconds': self.total_seconds,
+            'percent': min(100.0, 100.0 * done_seconds / self.total_seconds),
+            'eta_seconds': remaining / rate if rate > 0 else None,
+            'completed': self.completed,
+            'total': len(self.files)
+        }
+
+
+class RunTimings:
+    """Tiempos por etapa de cada trabajo de un lote
+    
+    Cada etapa (inspección, silencio, concatenación, codificación, copia a
+    su nombre final...) se registra con su inicio y fin, el archivo al que
+    pertenece y el hilo que la ejecutó. Las etapas de lote que no son de
+    ningún archivo usan el índice -1; las de varios archivos procesados a
+    la vez se reparten entre ellos. Es seguro usarlo desde varios hilos.
+    """
+    
+    CSV_FIELDS = ('index', 'input_file', 'stage', 'start', 'seconds', 'thread')
+    
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[Tuple[int, str, float, float, int]] = []  # (índice, etapa, inicio, fin, hilo)
+        self.files: Dict[int, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def job(self, index: int, input_file: str):
+        """Asociar al hilo actual las etapas de un archivo y medir el total"""
+        with self._lock:
+            self.files[index] = input_file
+        self._local.index = index
+        try:
+            with self.stage('job'):
+                yield
+        finally:
+            self._local.index = -1
+    
+    @contextmanager
+    def jobs(self, members: List[Tuple[int, str, float]]):
+        """Como ``job`` para varios archivos que comparten una invocación de FFmpeg
+        
+        ``members`` son ``(índice, archivo, peso)``. Cada etapa se divide en
+        tramos consecutivos, uno por archivo y proporcionales a su peso (la
+        duración de su salida), de modo que los totales por etapa siguen
+        siendo el tiempo real y no se cuentan una vez por archivo.
+        """
+        with self._lock:
+            for index, input_file, _ in members:
+                self.files[index] = input_file
+        total = sum(max(weight, 0.0) for _, _, weight in members)
+        self._local.index = tuple(
+            (index, max(weight, 0.0) / total if total > 0 else 1 / len(members))
+            for index, _, weight in members)
+        try:
+            with self.stage('job'):
+                yield
+        finally:
+            self._local.index = -1
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Medir una etapa del archivo que se procesa en este hilo"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+    
+    def record(self, name: str, start: float):
+        """Registrar una etapa que empezó en ``start`` (``time.perf_counter``) y acaba ahora"""
+        end = time.perf_counter()
+        index = getattr(self._local, 'index', -1)
+        thread = threading.get_ident()
+        with self._lock:
+            if not isinstance(index, tuple):
+                self.events.append((index, name, start - self.origin, end - self.origin, thread))
+                return
+            # Etapa compartida: un tramo de la duración real para cada archivo
+            offset = start
+            for member, share in index:
+                step = (end - start) * share
+                self.events.append((member, name, offset - self.origin, offset + step - self.origin,
+                                    thread))
+                offset += step
+    
+    def durations(self) -> Dict[str, List[float]]:
+        """Duraciones de cada etapa, en segundos"""
+        stages: Dict[str, List[float]] = {}
+        with self._lock:
+            for _, name, start, end, _ in self.events:
+                stages.setdefault(name, []).append(end - start)
+        return stages
+    
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Estadísticas de cada etapa en todo el lote"""
+        summary = {}
+        for name, values in self.durations().items():
+            values.sort()
+            count = len(values)
+            summary[name] = {
+                'count': count,
+                'total': round(sum(values), 6),
+                'mean': round(sum(values) / count, 6),
+                'p50': round(values[(count - 1) // 2], 6),
+                'p95': round(values[min(count - 1, int(count * 0.95))], 6),
+                'max': round(values[-1], 6),
+            }
+        return summary
+    
+    def file_summary(self) -> List[Dict]:
+        """Segundos de cada etapa por archivo"""
+        per_file: Dict[int, Dict[str, float]] = {}
+        with self._lock:
+            for index, name, start, end, _ in self.events:
+                if index >= 0:
+                    stages = per_file.setdefault(index, {})
+                    stages[name] = round(stages.get(name, 0.0) + end - start, 6)
+            files = dict(self.files)
+        return [{'index': index, 'input_file': files.get(index, ""), 'stages': per_file[index]}
+                for index in sorted(per_file)]
+    
+    def report(self) -> Dict:
+        """Informe completo: resumen por etapa y detalle por archivo"""
+        return {'stages': self.stage_summary(), 'files': self.file_summary()}
+    
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    
+    def write_csv(self, path: str):
+        """Una fila por etapa registrada"""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event[2])
+            files = dict(self.files)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.CSV_FIELDS)
+            for index, name, start, end, thread in events:
+                writer.writerow([index, files.get(index, ""), name, f"{start:.6f}",
+                                 f"{end - start:.6f}", thread])
+    
+    def write_chrome_trace(self, path: str):
+        """Volcar las etapas en formato ``trace_event`` (chrome://tracing, Perfetto)"""
+        with self._lock:
+            events = list(self.events)
+            files = dict(self.files)
+        
+        # Hilos numerados en orden de aparición para que la vista sea legible
+        threads: Dict[int, int] = {}
+        for event in sorted(events, key=lambda event: event[2]):
+            threads.setdefault(event[4], len(threads))
+        
+        pid = os.getpid()
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                  'args': {'name': f"trabajador {tid}"}} for tid in threads.values()]
+        for index, name, start, end, thread in events:
+            trace.append({
+                'name': name, 'cat': 'batch' if index < 0 else 'job', 'ph': 'X',
+                'ts': round(start * 1000000, 1), 'dur': round((end - start) * 1000000, 1),
+                'pid': pid, 'tid': threads[thread],
+                'args': {'index': index, 'file': os.path.basename(files.get(index, ""))}
+            })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    
+    def histogram(self, bins: int = 10, width: int = 40) -> str:
+        """Histograma de texto de las duraciones de cada etapa"""
+        lines = []
+        for name, values in sorted(self.durations().items()):
+            low, high = min(values), max(values)
+            step = (high - low) / bins or 1.0
+            counts = [0] * bins
+            for value in values:
+                counts[min(bins - 1, int((value - low) / step))] += 1
+            peak = max(counts)
+            lines.append(f"{name}: {len(values)} veces, {sum(values):.3f} s en total")
+            for i, count in enumerate(counts):
+                if low == high and i > 0:
+                    break
+                bar = '#' * round(count / peak * width)
+                lines.append(f"  {(low + i * step) * 1000:10.2f} ms | {bar} {count}")
+        return "\n".join(lines)
+
+
+# Codificaciones de prueba como máximo para ajustar un tamaño exacto
+TARGET_SIZE_PASSES = 3
+
+
+def plan_target_bitrate(duration: float, sample_rate: int, channels: int, target: int,
+                        tag_bytes: int = 0, below: Optional[int] = None) -> Optional[int]:
+    """Mayor bitrate CBR cuyo archivo no supera ``target`` bytes
+    
+    Con ``below`` solo se consideran bitrates menores que ese valor.
+    Devuelve None si ni el bitrate mínimo cabe.
+    """
+    version = mp3_frames.mpeg_version(sample_rate)
+    for bitrate in reversed(mp3_frames.layer3_bitrates(version)):
+        if below and bitrate >= below:
+            continue
+        if mp3_frames.estimate_cbr_size(duration, sample_rate, bitrate, channels, tag_bytes) <= target:
+            return bitrate
+    return None
+
+
+def split_target_total(infos: List[Optional[ProbeInfo]], total: int, padding: float) -> List[int]:
+    """Repartir un tamaño total entre archivos en proporción a su duración
+    
+    Cada archivo conserva además el tamaño de sus etiquetas. La suma de
+    las partes es exactamente ``total``.
+    """
+    if not infos:
+        return []
+    durations = [(info.duration if info else 0.0) + padding for info in infos]
+    fixed = [info.tag_bytes if info else 0 for info in infos]
+    budget = total - sum(fixed)
+    weight = sum(durations) or 1.0
+    shares = [tags + int(budget * duration / weight) for tags, duration in zip(fixed, durations)]
+    shares[-1] += total - sum(shares)
+    return shares
+
+
+# Bitrate medio aproximado de LAME con -q:a 2 (VBR), por número de canales
+VBR_ESTIMATE_BITRATE = {1: 110000, 2: 190000}
+
+# Muestras extra que añade LAME (retardo del codificador y del decodificador)
+LAME_EXTRA_SAMPLES = mp3_frames.ENCODER_DELAY + mp3_frames.DECODER_DELAY
+
+
+def encode_bitrate(options: ProcessingOptions, original_bitrate: int = 0) -> int:
+    """Bitrate (bps) con el que se recodificará un archivo; 0 para VBR"""
+    if options.bitrate == "vbr":
+        return 0
+    if options.bitrate == "original":
+        return round((original_bitrate or 128000) / 1000) * 1000
+    try:
+        return int(options.bitrate.lower().rstrip('k')) * 1000
+    except ValueError:
+        return 128000
+
+
+def estimate_output_bytes(info: Optional[ProbeInfo], options: ProcessingOptions) -> int:
+    """Tamaño estimado en bytes de la salida de un archivo (0 si no se sabe)
+    
+    Sigue el mismo camino que el procesamiento: copia directa de tramas,
+    recodificación CBR (con el cálculo exacto de tramas de ``mp3_frames``)
+    o VBR (con un bitrate medio aproximado).
+    """
+    if options.target_size:
+        return options.target_size
+    if not info or not info.duration:
+        return 0
+    
+    duration = info.duration + options.silence_start + options.silence_end
+    if options.bitrate == "original" and options.stream_copy and info.source == 'frames':
+        # Las tramas se conservan: crece en proporción al silencio añadido
+        return int(info.size * duration / info.duration)
+    
+    channels = 1 if info.channels == 1 else 2
+    bitrate = encode_bitrate(options, info.bit_rate)
+    if not bitrate:
+        return info.tag_bytes + int(duration * VBR_ESTIMATE_BITRATE[channels] / 8)
+    try:
+        version = mp3_frames.mpeg_version(info.sample_rate)
+    except mp3_frames.Mp3FormatError:
+        return info.tag_bytes + int(duration * bitrate / 8)
+    bitrate = mp3_frames.nearest_layer3_bitrate(version, bitrate)
+    return mp3_frames.estimate_cbr_size(duration, info.sample_rate, bitrate, channels, info.tag_bytes)
+
+
+@dataclass
+class SizePlan:
+    """Resultado de estimar los tamaños de toda la lista"""
+    estimated: List[int]      # Bytes estimados por fila (-1 si no se conoce)
+    total_original: int
+    total_estimated: int
+    total_duration: float     # Duración total de las salidas en segundos
+    known: int                # Filas con metadatos
+
+
+class SizePlanner:
+    """Estimación de tamaños de salida para toda la lista a la vez
+    
+    Los metadatos se guardan por columnas (una lista por campo, en el orden
+    de la lista de archivos). Con NumPy la estimación se calcula sobre
+    arrays completos; sin NumPy se recorre fila a fila con
+    ``estimate_output_bytes``.
+    """
+    
+    COLUMNS = ('size', 'duration', 'bit_rate', 'sample_rate', 'channels', 'tag_bytes', 'frames')
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        """Vaciar todas las filas"""
+        self._rows: Dict[str, int] = {}
+        self._infos: List[Optional[ProbeInfo]] = []
+        self._columns: Dict[str, list] = {name: [] for name in self.COLUMNS}
+        self._arrays = None
+    
+    def __len__(self) -> int:
+        return len(self._infos)
+    
+    def add(self, path: str, size: int, info: Optional[ProbeInfo] = None):
+        """Añadir una fila al final (o actualizarla si ya existe)"""
+        key = file_key(path)
+        if key in self._rows:
+            self.update(path, size, info)
+            return
+        self._rows[key] = len(self._infos)
+        self._infos.append(None)
+        for column in self._columns.values():
+            column.append(0)
+        self.update(path, size, info)
+    
+    def update(self, path: str, size: int, info: Optional[ProbeInfo]):
+        """Actualizar los metadatos de una fila existente"""
+        row = self._rows.get(file_key(path))
+        if row is None:
+            return
+        self._infos[row] = info
+        values = {
+            'size': info.size if info else size,
+            'duration': info.duration if info else 0.0,
+            'bit_rate': info.bit_rate if info else 0,
+            'sample_rate': info.sample_rate if info else 0,
+            'channels': info.channels if info else 0,
+            'tag_bytes': info.tag_bytes if info else 0,
+            'frames': bool(info and info.source == 'frames')
+        }
+        for name, value in values.items():
+            self._columns[name][row] = value
+        self._arrays = None
+    
+    def estimate(self, options: ProcessingOptions) -> SizePlan:
+        """Estimar el tamaño de salida de todas las filas"""
+        if NUMPY_AVAILABLE:
+            estimated, sizes, durations = self._estimate_arrays(options)
+            known = durations > 0
+            padding = options.silence_start + options.silence_end
+            return SizePlan(
+                estimated=np.where(known, estimated, -1).tolist(),
+                total_original=int(sizes[known].sum()),
+                total_estimated=int(estimated[known].sum()),
+                total_duration=float((durations[known] + padding).sum()),
+                known=int(known.sum()))
+        
+        padding = options.silence_start + options.silence_end
+        known_infos = [info for info in self._infos if info and info.duration]
+        if options.target_total:
+            shares = iter(split_target_total(known_infos, options.target_total, padding))
+        estimated = []
+        for info in self._infos:
+            if not info or not info.duration:
+                estimated.append(-1)
+            elif options.target_total:
+                estimated.append(next(shares))
+            else:
+                estimated.append(estimate_output_bytes(info, options))
+        return SizePlan(
+            estimated=estimated,
+            total_original=sum(info.size for info in known_infos),
+            total_estimated=sum(size for size in estimated if size > 0),
+            total_duration=sum(info.duration + padding for info in known_infos),
+            known=len(known_infos))
+    
+    def _estimate_arrays(self, options: ProcessingOptions):
+        """Versión vectorizada de ``estimate_output_bytes`` para todas las filas"""
+        if self._arrays is None:
+            self._arrays = {name: np.asarray(values) for name, values in self._columns.items()}
+        a = self._arrays
+        sizes = a['size'].astype(np.int64)
+        durations = a['duration'].astype(np.float64)
+        padding = options.silence_start + options.silence_end
+        out_durations = durations + padding
+        tag_bytes = a['tag_bytes'].astype(np.int64)
+        known = durations > 0
+        
+        if options.target_size:
+            return np.full(len(sizes), options.target_size, dtype=np.int64), sizes, durations
+        
+        if options.target_total:
+            # Mismo reparto que split_target_total, sobre las filas conocidas
+            weights = np.where(known, out_durations, 0.0)
+            fixed = np.where(known, tag_bytes, 0)
+            budget = options.target_total - int(fixed.sum())
+            shares = fixed + (budget * weights / (weights.sum() or 1.0)).astype(np.int64)
+            if known.any():
+                last = np.flatnonzero(known)[-1]
+                shares[last] += options.target_total - int(shares[known].sum())
+            return shares, sizes, durations
+        
+        channels = np.where(a['channels'] == 1, 1, 2)
+        sample_rates = a['sample_rate'].astype(np.int64)
+        if options.bitrate == "vbr":
+            vbr_rate = np.where(channels == 1, VBR_ESTIMATE_BITRATE[1], VBR_ESTIMATE_BITRATE[2])
+            estimated = tag_bytes + (out_durations * vbr_rate / 8).astype(np.int64)
+            return estimated, sizes, durations
+        
+        if options.bitrate == "original":
+            bitrates = np.round(np.where(a['bit_rate'] > 0, a['bit_rate'], 128000) / 1000).astype(np.int64) * 1000
+        else:
+            bitrates = np.full(len(sizes), encode_bitrate(options), dtype=np.int64)
+        
+        # Bitrate real y trama Xing por combinación de frecuencia, canales y
+        # bitrate: hay pocas combinaciones distintas aunque haya miles de filas
+        keys = (sample_rates * 10 + channels) * 1000000 + bitrates
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        snapped = np.zeros(len(unique_keys), dtype=np.int64)
+        xing = np.zeros(len(unique_keys), dtype=np.int64)
+        coef = np.zeros(len(unique_keys), dtype=np.int64)
+        spf = np.ones(len(unique_keys), dtype=np.int64)
+        valid = np.zeros(len(unique_keys), dtype=bool)
+        for n, key in enumerate(unique_keys.tolist()):
+            sample_rate, ch, bitrate = key // 10000000, (key // 1000000) % 10, key % 1000000
+            try:
+                version = mp3_frames.mpeg_version(sample_rate)
+            except mp3_frames.Mp3FormatError:
+                snapped[n] = bitrate
+                continue
+            snapped[n] = mp3_frames.nearest_layer3_bitrate(version, bitrate)
+            xing[n] = mp3_frames.xing_frame_length(version, int(snapped[n]), sample_rate, ch)
+            coef[n] = 144 if version == '1' else 72
+            spf[n] = 1152 if version == '1' else 576
+            valid[n] = True
+        
+        row_bitrates = snapped[inverse]
+        row_spf = spf[inverse]
+        samples = np.rint(out_durations * sample_rates).astype(np.int64)
+        frames = -(-(samples + LAME_EXTRA_SAMPLES) // row_spf)
+        safe_rates = np.where(sample_rates > 0, sample_rates, 1)
+        audio = np.rint(frames * coef[inverse] * row_bitrates / safe_rates).astype(np.int64)
+        cbr = tag_bytes + xing[inverse] + audio
+        linear = tag_bytes + (out_durations * row_bitrates / 8).astype(np.int64)
+        estimated = np.where(valid[inverse], cbr, linear)
+        
+        if options.bitrate == "original" and options.stream_copy:
+            safe_durations = np.where(known, durations, 1.0)
+            copied = (sizes * out_durations / safe_durations).astype(np.int64)
+            estimated = np.where(a['frames'].astype(bool), copied, estimated)
+        return estimated, sizes, durations
+
+
+def common_directory(files: List[str]) -> str:
+    """Carpeta común de una lista de archivos (para mantener la estructura)"""
+    if len(files) <= 1:
+        return ""
+    try:
+        return os.path.commonpath([os.path.dirname(f) for f in files])
+    except ValueError:
+        return ""
+
+
+def summarize_results(results: List[JobResult]) -> Dict[str, int]:
+    """Contar los trabajos completados, cancelados y con error"""
+    succeeded = sum(1 for r in results if r.success)
+    cancelled = sum(1 for r in results if r.cancelled)
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'skipped': sum(1 for r in results if r.skipped),
+        'cancelled': cancelled,
+        'failed': len(results) - succeeded - cancelled
+    }
+
+
+class MP3Processor:
+    """Motor de procesamiento por lotes compartido por la interfaz y la CLI
+    
+    No depende de Tk: los avisos se entregan a ``notify(tipo, mensaje)`` y
+    el progreso a la función ``on_result`` de ``run_batch``.
+    """
+    
+    def __init__(self, probe_cache: ProbeCache, silence_cache: Optional[SilenceCache] = None,
+                 notify: Optional[Callable[[str, str], None]] = None,
+                 tools: Optional[ToolLocator] = None):
+        self.probe_cache = probe_cache
+        self.silence_cache = silence_cache
+        self.notify = notify or (lambda kind, message: None)
+        self.tools = tools or TOOLS
+        
+        # Procesos de FFmpeg en curso (para poder cancelarlos)
+        self.active_processes = set()
+        self.process_lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        
+        # Tiempos por etapa del lote en curso (solo si se piden)
+        self.timings: Optional[RunTimings] = None
+        
+        # Primer fallo del trabajo que se procesa en cada hilo
+        self._failure = threading.local()
+    
+    def cancel(self):
+        """Cancelar el lote en curso y detener los procesos de FFmpeg activos"""
+        self.cancel_event.set()
+        with self.process_lock:
+            processes = list(self.active_processes)
+        for proc in processes:
+            self._kill_process(proc)
+    
+    def run_batch(self, files: List[str], options: ProcessingOptions,
+                  on_result: Optional[Callable[[JobResult, int, int], None]] = None,
+                  on_progress: Optional[Callable[[Dict], None]] = None,
+                  journal: Optional[JobJournal] = None, resume: bool = False,
+                  timings: Optional[RunTimings] = None) -> List[JobResult]:
+        """Procesar una lista de archivos con un grupo de trabajadores
+        
+        Devuelve un resultado por archivo, en el mismo orden que ``files``.
+        ``on_result(resultado, completados, total)`` se llama desde el hilo
+        coordinador cada vez que termina un trabajo. ``on_progress`` recibe
+        el avance de FFmpeg (ver ``BatchProgress``) desde los trabajadores.
+        
+        Con ``journal`` se registra el estado de cada trabajo; con ``resume``
+        se omiten los ya terminados de una ejecución anterior del mismo lote
+        y los demás reutilizan la ruta de salida que tenían asignada.
+        
+        Con ``timings`` se mide cada etapa de cada trabajo (ver ``RunTimings``).
+        """
+        self.cancel_event.clear()
+        self.timings = timings
+        prepare_start = time.perf_counter()
+        total_files = len(files)
+        results: List[Optional[JobResult]] = [None] * total_files
+        
+        # Carpeta para intermedios, resuelta una vez para todo el lote
+        options = replace(options, scratch_dir=scratch_directory(options.scratch_dir))
+        cleanup_stale_scratch(options.scratch_dir)
+        
+        batch_id = journal.batch_id(files, options) if journal else None
+        previous = journal.load(batch_id) if journal and resume else {}
+        
+        # Manifiesto de salidas de ejecuciones anteriores con la misma configuración
+        settings = JobJournal.settings_hash(options, per_file=True)
+        manifest = journal.load_manifest(settings) if journal and options.skip_unchanged else {}
+        
+        # Las rutas ya asignadas (registro del lote anterior o salidas propias
+        # del manifiesto) se reservan primero para que los trabajos nuevos no
+        # las ocupen
+        fingerprints = {}
+        assigned = {}
+        for i, input_file in enumerate(files):
+            fingerprints[i] = JobJournal.fingerprint(input_file)
+            entry = previous.get(i)
+            output = manifest.get(file_key(input_file))
+            if entry and entry[0] == input_file:
+                assigned[i] = entry[2]
+            elif output and JobJournal.fingerprint(output[2]) == output[3]:
+                # Salida nuestra y sin modificar: se actualiza en su sitio
+                assigned[i] = output[2]
+        reserved = set(assigned.values())
+        
+        # Resolver todas las rutas de salida antes de empezar, en orden,
+        # para que los nombres ({counter}, sufijos _1, _2...) sean estables
+        jobs = []
+        records = []
+        for i, input_file in enumerate(files):
+            if fingerprints[i] is None:
+                self.notify("warning", f"Archivo no encontrado: {input_file}")
+                results[i] = JobResult(i, input_file, error="Archivo no encontrado")
+                records.append((i, input_file, "", "", "failed"))
+                continue
+            
+            output = manifest.get(file_key(input_file))
+            if output and journal.is_current(output, input_file, fingerprints[i]):
+                # La salida existente sigue al día: no hace falta FFmpeg
+                results[i] = JobResult(i, input_file, output[2], success=True, skipped=True)
+                records.append((i, input_file, fingerprints[i], output[2], "done"))
+                continue
+            
+            entry = previous.get(i)
+            if entry and entry[0] == input_file and entry[3] == "done" and \
+                    entry[1] == fingerprints[i] and os.path.exists(entry[2]):
+                # Terminado en una ejecución anterior
+                results[i] = JobResult(i, input_file, entry[2], success=True, skipped=True)
+                records.append((i, input_file, fingerprints[i], entry[2], "done"))
+                continue
+            
+            output_file = assigned.get(i)
+            if not output_file:
+                output_file = self.get_output_path(input_file, i, total_files, options, reserved)
+                reserved.add(output_file)
+            jobs.append((i, input_file, output_file, options))
+            records.append((i, input_file, fingerprints[i], output_file, "pending"))
+        
+        if journal:
+            journal.start(batch_id, options, records)
+        if timings:
+            timings.record('prepare', prepare_start)
+        
+        # Tamaño total del lote: cada trabajo recibe su parte como tamaño exacto
+        if options.target_total and jobs:
+            shares = split_target_total([self.probe_cache.get(job[1]) for job in jobs],
+                                        options.target_total,
+                                        options.silence_start + options.silence_end)
+            jobs = [(i, input_file, output_file, replace(job_options, target_size=share, target_total=0))
+                    for (i, input_file, output_file, job_options), share in zip(jobs, shares)]
+        
+        done_count = 0
+        for result in results:
+            if result is not None:
+                done_count += 1
+                if on_result:
+                    on_result(result, done_count, total_files)
+        workers = max(1, min(options.max_workers, len(jobs)))
+        
+        # Duración esperada de cada salida, para ponderar el progreso
+        progress = None
+        if on_progress:
+            padding = options.silence_start + options.silence_end
+            expected = {}
+            for i, input_file, _, _ in jobs:
+                info = self.probe_cache.get(input_file)
+                expected[i] = (info.duration if info else 0.0) + padding
+            progress = BatchProgress(expected, files, on_progress)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Los archivos cortos se agrupan para compartir una invocación de FFmpeg
+            futures = [pool.submit(self._run_group, group, progress)
+                       for group in self._plan_groups(jobs, workers)]
+            
+            for future in as_completed(futures):
+                for result in future.result():
+                    results[result.index] = result
+                    done_count += 1
+                    if journal:
+                        status = "done" if result.success else ("cancelled" if result.cancelled else "failed")
+                        journal.mark(batch_id, result.index, status, result.error)
+                        if result.success:
+                            journal.record_output(result.input_file, settings,
+                                                  fingerprints[result.index], result.output_file)
+                    if progress:
+                        progress.finish(result.index)
+                    if on_result:
+                        on_result(result, done_count, total_files)
+        
+        return results
+    
+    def generate_output_filename(self, input_file: str, index: int, total: int,
+                                 options: ProcessingOptions) -> str:
+        """Generar nombre de archivo de salida basado en el patrón"""
+        pattern = options.name_pattern
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        ext = os.path.splitext(input_file)[1]
+        
+        # Obtener información adicional del archivo si es posible
+        artist = "Unknown"
+        title = "Unknown"
+        
+        info = self.probe_cache.get(input_file)
+        if info:
+            artist = info.tag('artist')
+            title = info.tag('title')
+        
+        # Reemplazar variables en el patrón
+        now = datetime.now()
+        
+        # Obtener bitrate para el nombre del archivo
+        bitrate_str = options.bitrate
+        bitrate_display = "original" if bitrate_str == "original" else bitrate_str.replace('k', '') + "kbps"
+        
+        replacements = {
+            '{filename}': base_name,
+            '{ext}': ext,
+            '{bitrate}': bitrate_display,
+            '{date}': now.strftime('%Y-%m-%d'),
+            '{time}': now.strftime('%H-%M-%S'),
+            '{counter}': f"{index + 1:02d}",
+            '{total}': f"{total:02d}",
+            '{artist}': re.sub(r'[^\w\-_\. ]', '_', artist),
+            '{title}': re.sub(r'[^\w\-_\. ]', '_', title)
+        }
+        
+        output_name = pattern
+        for key, value in replacements.items():
+            output_name = output_name.replace(key, str(value))
+        
+        # Asegurar que el nombre sea válido
+        output_name = re.sub(r'[^\w\-_\. ]', '_', output_name)
+        
+        # Añadir extensión si no la tiene
+        if not output_name.endswith('.mp3'):
+            output_name += '.mp3'
+        
+        return output_name
+    
+    def get_output_path(self, input_file: str, index: int, total: int,
+                        options: ProcessingOptions, reserved: Optional[Set[str]] = None) -> str:
+        """Obtener ruta completa de salida para un archivo
+        
+        ``reserved`` contiene las rutas ya asignadas en el lote actual, para que
+        dos trabajos en paralelo nunca escriban el mismo archivo.
+        """
+        reserved = reserved if reserved is not None else set()
+        
+        # Determinar carpeta de salida
+        output_dir = options.output_folder
+        if not output_dir or not os.path.exists(output_dir):
+            output_dir = os.path.dirname(input_file)
+        
+        # Si se mantiene estructura de carpetas
+        if options.preserve_folders:
+            # Obtener ruta relativa si hay archivos en diferentes carpetas
+            if options.common_dir:
+                try:
+                    rel_path = os.path.relpath(os.path.dirname(input_file), options.common_dir)
+                    output_dir = os.path.join(output_dir, rel_path)
+                except:
+                    pass
+            os.makedirs(output_dir, exist_ok=True)
+        
+        # Generar nombre de archivo
+        filename = self.generate_output_filename(input_file, index, total, options)
+        
+        # Verificar si ya existe y manejar sobreescritura
+        output_path = os.path.join(output_dir, filename)
+        
+        exists = os.path.exists(output_path) and not options.overwrite
+        if exists or output_path in reserved:
+            # Añadir sufijo único
+            base, ext = os.path.splitext(output_path)
+            counter = 1
+            while os.path.exists(f"{base}_{counter}{ext}") or f"{base}_{counter}{ext}" in reserved:
+                counter += 1
+            output_path = f"{base}_{counter}{ext}"
+        
+        return output_path
+    
+    def _run_job(self, index: int, input_file: str, output_file: str,
+                 options: ProcessingOptions, progress: Optional[BatchProgress] = None) -> JobResult:
+        """Ejecutar un trabajo del lote dentro del grupo de trabajadores"""
+        result = JobResult(index, input_file, output_file)
+        
+        if self.cancel_event.is_set():
+            result.cancelled = True
+            return result
+        
+        on_progress = None
+        if progress:
+            on_progress = lambda seconds, speed: progress.update(index, seconds, speed)
+        
+        self._failure.error_class = None
+        self._failure.stderr = ""
+        if self.timings:
+            with self.timings.job(index, input_file):
+                result.success = self._process_single_file(input_file, output_file, options, on_progress)
+        else:
+            result.success = self._process_single_file(input_file, output_file, options, on_progress)
+        if not result.success:
+            if self.cancel_event.is_set():
+                result.cancelled = True
+            else:
+                result.error = f"Error al procesar {os.path.basename(input_file)}{self.failure_suffix()}"
+                result.error_class = self._failure.error_class or ""
+                result.stderr_tail = self._failure.stderr
+        return result
+    
+    def _plan_groups(self, jobs: List[Tuple], workers: int) -> List[List[Tuple]]:
+        """Repartir los trabajos en grupos que comparten una invocación de FFmpeg
+        
+        Solo se agrupan archivos de hasta ``SMALL_FILE_SECONDS`` sin tamaño
+        exacto, en grupos de ``GROUP_MAX_FILES`` como máximo y sin dejar
+        trabajadores ociosos. Los demás trabajos van solos.
+        """
+        groups = []
+        small = []
+        for job in jobs:
+            info = self.probe_cache.get(job[1])
+            if job[3].target_size or not info or not 0 < info.duration <= SMALL_FILE_SECONDS \
+                    or self.can_splice(info, job[3]):
+                groups.append([job])
+            else:
+                small.append(job)
+        
+        size = min(GROUP_MAX_FILES, -(-len(small) // workers)) if small else 1
+        groups.extend(small[start:start + size] for start in range(0, len(small), size))
+        return groups
+    
+    def _run_group(self, group: List[Tuple], progress: Optional[BatchProgress] = None) -> List[JobResult]:
+        """Ejecutar un grupo de trabajos con una sola invocación de FFmpeg
+        
+        Si la invocación conjunta falla, cada archivo se procesa después por
+        separado, de modo que un archivo dañado no hace fallar a los demás y
+        su error queda en su propio resultado.
+        """
+        if len(group) == 1:
+            return [self._run_job(*group[0], progress)]
+        
+        if self.cancel_event.is_set():
+            grouped = False
+        elif self.timings:
+            padding = group[0][3].silence_start + group[0][3].silence_end
+            members = []
+            for index, input_file, _, _ in group:
+                info = self.probe_cache.get(input_file)
+                members.append((index, input_file, (info.duration if info else 0.0) + padding))
+            with self.timings.jobs(members):
+                grouped = self._process_group(group, progress)
+        else:
+            grouped = self._process_group(group, progress)
+        if grouped:
+            return [JobResult(i, input_file, output_file, success=True)
+                    for i, input_file, output_file, _ in group]
+        if self.cancel_event.is_set():
+            return [JobResult(i, input_file, output_file, cancelled=True)
+                    for i, input_file, output_file, _ in group]
+        return [self._run_job(*job, progress) for job in group]
+    
+    def _process_group(self, group: List[Tuple], progress: Optional[BatchProgress] = None) -> bool:
+        """Procesar varios archivos cortos con un único proceso de FFmpeg
+        
+        Cada archivo es una o dos entradas del comando y tiene su propia
+        salida, con las mismas opciones que si se procesara solo. Las salidas
+        se escriben con nombre temporal y solo se confirman si todo el grupo
+        termina bien.
+        """
+        if not self.tools.find('ffmpeg').available:
+            return False
+        
+        # FFmpeg avanza todas las salidas a la vez (intercala las entradas por
+        # tiempo), así que su posición vale para cada archivo del grupo
+        def report(seconds, speed):
+            for index, _, _, _ in group:
+                progress.update(index, seconds, speed)
+        on_progress = report if progress else None
+        
+        temp_files = [partial_output_path(output_file) for _, _, output_file, _ in group]
+        try:
+            needed: Dict[str, int] = {}
+            for _, input_file, output_file, options in group:
+                directory = os.path.dirname(output_file)
+                os.makedirs(directory, exist_ok=True)
+                needed[directory] = needed.get(directory, 0) + \
+                    self.estimate_output_size(self.probe_cache.get(input_file), options)
+            if not all(has_free_space(directory, size) for directory, size in needed.items()):
+                return False
+            
+            with self.scratch(group[0][3]) as temp_dir:
+                inputs = []
+                outputs = []
+                gapless = []
+                for (_, input_file, _, options), temp_file in zip(group, temp_files):
+                    info = self.probe_cache.get(input_file)
+                    index = inputs.count('-i')
+                    args = False
+                    if options.bitrate == "original" and options.stream_copy and self.can_stream_copy(info):
+                        try:
+                            args = self._stream_copy_args(input_file, temp_file, options, info, temp_dir, index)
+                        except mp3_frames.Mp3FormatError:
+                            args = False
+                        if args is None:
+                            return False
+                    if args:
+                        inputs.extend(args[0])
+                        outputs.extend(args[1])
+                        gapless.append((temp_file, args[2]))
+                    else:
+                        inputs.extend(['-i', input_file])
+                        outputs.extend(self._encode_output_args(input_file, temp_file, options, index))
+                
+                cmd = [self.tools.path('ffmpeg')] + inputs + outputs + ['-y']
+                with self.stage('group'):
+                    if self._run_ffmpeg(cmd, on_progress) != 0:
+                        return False
+                for temp_file, fields in gapless:
+                    self._apply_gapless(temp_file, fields)
+            
+            with self.stage('commit'):
+                for (_, _, output_file, options), temp_file in zip(group, temp_files):
+                    commit_output(temp_file, output_file, options.fsync)
+            return True
+        except Exception:
+            # Se reintenta archivo por archivo, que informa del error concreto
+            return False
+        finally:
+            for temp_file in temp_files:
+                if os.path.exists(temp_file):
+                    try:
+                        os.remove(temp_file)
+                    except OSError:
+                        pass
+    
+    def _set_failure(self, error_class: str, stderr: str = ""):
+        """Recordar la causa del fallo del trabajo actual (solo la primera)"""
+        if getattr(self._failure, 'error_class', None) is None:
+            self._failure.error_class = error_class
+            self._failure.stderr = stderr
+    
+    def failure_suffix(self) -> str:
+        """Descripción entre paréntesis del fallo del trabajo actual ('' si se desconoce)"""
+        error_class = getattr(self._failure, 'error_class', None)
+        return f" ({ERROR_CLASSES[error_class]})" if error_class else ""
+    
+    @contextmanager
+    def scratch(self, options: ProcessingOptions):
+        """Carpeta temporal única de un trabajo, eliminada siempre al salir
+        
+        Se borra también si el trabajo falla o se cancela.
+        """
+        directory = options.scratch_dir or scratch_directory()
+        with self.stage('scratch'):
+            temp_dir = tempfile.mkdtemp(prefix=f"{SCRATCH_PREFIX}{os.getpid()}_", dir=directory)
+        try:
+            yield temp_dir
+        finally:
+            with self.stage('cleanup'):
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Medir una etapa del trabajo actual si el lote registra tiempos"""
+        if self.timings is None:
+            yield
+        else:
+            with self.timings.stage(name):
+                yield
+    
+    def estimate_output_size(self, info: Optional[ProbeInfo], options: ProcessingOptions) -> int:
+        """Tamaño aproximado en bytes del archivo de salida"""
+        return estimate_output_bytes(info, options)
+    
+    def _run_ffmpeg(self, cmd: List[str],
+                    on_progress: Optional[Callable[[float, Optional[float]], None]] = None) -> int:
+        """Ejecutar FFmpeg registrando el proceso para poder cancelarlo
+        
+        Con ``on_progress`` se añade ``-progress pipe:1`` y se llama a
+        ``on_progress(segundos, velocidad)`` a medida que FFmpeg avanza.
+        La salida de error se lee en un hilo aparte a un ``StderrTail``; si
+        FFmpeg falla, su final y el tipo de error quedan en el resultado.
+        """
+        flags = ['-hide_banner', '-nostats']
+        if on_progress:
+            flags += ['-progress', 'pipe:1']
+        cmd = cmd[:1] + flags + cmd[1:]
+        
+        kwargs = {}
+        if platform.system() == "Windows":
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW
+        else:
+            # Grupo de procesos propio para poder matar también a sus hijos
+            kwargs['start_new_session'] = True
+        
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, errors='replace', **kwargs)
+        tail = StderrTail()
+        reader = threading.Thread(target=tail.drain, args=(proc.stderr,), daemon=True)
+        reader.start()
+        with self.process_lock:
+            self.active_processes.add(proc)
+        try:
+            # Si se canceló mientras se lanzaba, no esperar a que termine
+            if self.cancel_event.is_set():
+                self._kill_process(proc)
+            
+            # Leer el progreso línea a línea (bloques clave=valor que
+            # terminan en "progress=continue" o "progress=end")
+            fields = {}
+            for line in proc.stdout:
+                key, _, value = line.strip().partition('=')
+                fields[key] = value
+                if key == 'progress':
+                    if on_progress:
+                        on_progress(*parse_progress(fields))
+                    fields = {}
+            
+            proc.wait()
+            reader.join()
+            if proc.returncode != 0 and not self.cancel_event.is_set():
+                self._set_failure(tail.error_class, tail.text())
+            return proc.returncode
+        finally:
+            with self.process_lock:
+                self.active_processes.discard(proc)
+    
+    def _kill_process(self, proc: subprocess.Popen):
+        """Terminar un proceso de FFmpeg y todos sus hijos"""
+        if proc.poll() is not None:
+            return
+        try:
+            if platform.system() == "Windows":
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                               capture_output=True, **subprocess_flags())
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except (OSError, subprocess.SubprocessError):
+            try:
+                proc.kill()
+            except OSError:
+                pass
+    
+    def _process_single_file(self, input_file: str, output_file: str,
+                             options: ProcessingOptions, on_progress=None) -> bool:
+        """Procesar un solo archivo MP3 con una única invocación de FFmpeg
+        
+        FFmpeg escribe en un nombre temporal junto al destino, que solo se
+        renombra a ``output_file`` cuando el archivo está completo.
+        """
+        try:
+            with self.stage('probe'):
+                info = self.probe_cache.get(input_file)
+            # El empalme de tramas no necesita FFmpeg
+            native = self.can_splice(info, options)
+            if not native and not self.tools.find('ffmpeg').available:
+                self._set_failure('tool_missing')
+                self.notify("warning", f"FFmpeg no encontrado: no se puede procesar {os.path.basename(input_file)}")
+                return False
+            
+            # Crear carpeta de salida si no existe
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            
+            # Comprobar el espacio libre antes de escribir nada
+            with self.stage('free_space'):
+                enough_space = has_free_space(os.path.dirname(output_file),
+                                              self.estimate_output_size(info, options))
+            if not enough_space:
+                self._set_failure('disk_full')
+                self.notify("warning", f"No hay espacio suficiente para {os.path.basename(output_file)}")
+                return False
+            
+            temp_file = partial_output_path(output_file)
+            try:
+                if options.target_size:
+                    success = self._encode_target_size(input_file, temp_file, options, info, on_progress)
+                elif native:
+                    success = self._splice_file(input_file, temp_file, options, info, on_progress)
+                # Camino rápido: con el bitrate original no hace falta recodificar
+                elif options.bitrate == "original" and options.stream_copy and self.can_stream_copy(info):
+                    success = self._stream_copy_file(input_file, temp_file, options, info, on_progress)
+                else:
+                    success = self._encode_file(input_file, temp_file, options, on_progress)
+                
+                if success:
+                    with self.stage('commit'):
+                        commit_output(temp_file, output_file, options.fsync)
+                return success
+            finally:
+                # Un archivo a medias (error o cancelación) nunca queda a la vista
+                if os.path.exists(temp_file):
+                    with self.stage('cleanup'):
+                        try:
+                            os.remove(temp_file)
+                        except OSError:
+                            pass
+            
+        except Exception as e:
+            self._set_failure(classify_error(str(e)), str(e))
+            self.notify("warning", f"Error procesando {os.path.basename(input_file)}: {str(e)}")
+            return False
+    
+    def _encode_target_size(self, input_file: str, output_file: str, options: ProcessingOptions,
+                            info: Optional[ProbeInfo], on_progress=None) -> bool:
+        """Codificar con el tamaño exacto ``options.target_size``
+        
+        Se elige el mayor bitrate CBR que cabe según el cálculo de tramas;
+        tras codificar se mide el archivo real (que corrige la estimación de
+        las etiquetas) y, si hace falta, se vuelve a codificar. Los bytes que
+        faltan se añaden como relleno de la etiqueta ID3v2.
+        """
+        name = os.path.basename(input_file)
+        target = options.target_size
+        if not info or not info.sample_rate or not info.duration:
+            self._set_failure('target_unreachable')
+            self.notify("warning", f"No se conoce la duración de {name} para ajustar su tamaño")
+            return False
+        
+        duration = info.duration + options.silence_start + options.silence_end
+        channels = 1 if info.channels == 1 else 2
+        # Las etiquetas se copian; FFmpeg añade además la suya (TSSE)
+        tag_bytes = info.tag_bytes + 64
+        
+        ceiling = None   # Bitrate más bajo que ya se ha pasado del objetivo
+        best = None      # (bitrate, tamaño) del mejor intento que cabe
+        in_file = None   # Bitrate del intento que hay ahora en output_file
+        for _ in range(TARGET_SIZE_PASSES):
+            bitrate = plan_target_bitrate(duration, info.sample_rate, channels, target, tag_bytes, ceiling)
+            if bitrate is None or (best and bitrate == best[0]):
+                break
+            
+            job_options = replace(options, bitrate=f"{bitrate // 1000}k")
+            if not self._encode_file(input_file, output_file, job_options, on_progress):
+                return False
+            in_file = bitrate
+            with self.stage('measure'):
+                size = os.path.getsize(output_file)
+            
+            # Lo que no explica el cálculo de tramas son etiquetas
+            tag_bytes = max(0, size - mp3_frames.estimate_cbr_size(
+                duration, info.sample_rate, bitrate, channels))
+            if size > target:
+                ceiling = bitrate
+            else:
+                best = (bitrate, size)
+        
+        if not best:
+            self._set_failure('target_too_small')
+            self.notify("warning", f"El tamaño objetivo es demasiado pequeño para {name}")
+            return False
+        
+        if in_file != best[0]:
+            # El último intento no cabía: volver al mejor que sí
+            job_options = replace(options, bitrate=f"{best[0] // 1000}k")
+            if not self._encode_file(input_file, output_file, job_options, on_progress):
+                return False
+        
+        try:
+            with self.stage('pad'):
+                mp3_frames.pad_id3v2(output_file, target - os.path.getsize(output_file))
+        except mp3_frames.Mp3FormatError as e:
+            self._set_failure('target_unreachable', str(e))
+            self.notify("warning", f"No se pudo ajustar el tamaño de {name}: {e}")
+            return False
+        
+        # Verificación final
+        if os.path.getsize(output_file) != target:
+            self._set_failure('target_unreachable')
+            self.notify("warning", f"El tamaño final de {name} no coincide con el objetivo")
+            return False
+        return True
+    
+    def _encode_file(self, input_file: str, output_file: str,
+                     options: ProcessingOptions, on_progress=None) -> bool:
+        """Recodificar un archivo añadiendo el silencio en el grafo de filtros"""
+        try:
+            cmd = [self.tools.path('ffmpeg'), '-i', input_file]
+            cmd.extend(self._encode_output_args(input_file, output_file, options))
+            cmd.append('-y')
+            
+            with self.stage('encode'):
+                returncode = self._run_ffmpeg(cmd, on_progress)
+            if returncode != 0:
+                if not self.cancel_event.is_set():
+                    self.notify("warning", f"Error al procesar {os.path.basename(input_file)}{self.failure_suffix()}")
+                return False
+            
+            return True
+            
+        except Exception as e:
+            self._set_failure(classify_error(str(e)), str(e))
+            self.notify("warning", f"Error procesando {os.path.basename(input_file)}: {str(e)}")
+            return False
+    
+    def _encode_output_args(self, input_file: str, output_file: str,
+                            options: ProcessingOptions, index: int = 0) -> List[str]:
+        """Opciones de FFmpeg de la salida recodificada de la entrada número ``index``"""
+        # Si el bitrate es "original", obtener el bitrate original del archivo
+        bitrate_str = options.bitrate
+        if bitrate_str == "original":
+            original_bitrate = self.get_original_bitrate(input_file)
+            if original_bitrate:
+                # Convertir a formato de FFmpeg (kbps)
+                bitrate_str = f"{round(original_bitrate / 1000)}k"
+            else:
+                bitrate_str = "128k"
+        
+        # Flujos explícitos: con varias entradas en una misma invocación, cada
+        # salida debe tomar solo los de su archivo
+        args = ['-map', f'{index}:a:0']
+        if options.preserve_meta:
+            # Carátula sin recodificar
+            args.extend(['-map', f'{index}:v?', '-c:v', 'copy'])
+        
+        # El silencio se añade dentro del grafo de filtros, así el audio se
+        # codifica una sola vez
+        audio_filter = self.build_silence_filter(options.silence_start, options.silence_end)
+        if audio_filter:
+            args.extend(['-af', audio_filter])
+        
+        args.extend(['-c:a', 'libmp3lame'])
+        
+        # Configurar bitrate
+        if bitrate_str != "vbr":
+            args.extend(['-b:a', bitrate_str])
+        else:
+            args.extend(['-q:a', '2'])
+        
+        # Preservar metadatos si está marcado
+        if options.preserve_meta:
+            args.extend(['-map_metadata', str(index), '-id3v2_version', '3'])
+        else:
+            args.extend(['-map_metadata', '-1'])
+        
+        # El formato se indica porque el nombre temporal no acaba en .mp3
+        args.extend(['-f', 'mp3', output_file])
+        return args
+    
+    def can_stream_copy(self, info: Optional[ProbeInfo]) -> bool:
+        """Indicar si un archivo admite el camino rápido sin recodificar"""
+        return bool(info and info.source == 'frames' and info.layer == 3
+                    and info.sample_rate and info.channels in (1, 2))
+    
+    def can_splice(self, info: Optional[ProbeInfo], options: ProcessingOptions) -> bool:
+        """Indicar si un archivo se puede procesar empalmando tramas, sin FFmpeg"""
+        return (options.native_splice and options.stream_copy and options.bitrate == "original"
+                and not options.target_size and self.can_stream_copy(info))
+    
+    def _splice_file(self, input_file: str, output_file: str, options: ProcessingOptions,
+                     info: ProbeInfo, on_progress=None) -> bool:
+        """Añadir silencio empalmando tramas de silencio con las originales
+        
+        Lo hace ``mp3_frames.splice_silence`` sin lanzar ningún proceso: el
+        audio original se copia tal cual y solo se reescriben la trama
+        Xing/LAME y las etiquetas. Si la estructura del archivo no lo permite
+        y hay FFmpeg, se usa la copia con FFmpeg.
+        """
+        if self.cancel_event.is_set():
+            return False
+        try:
+            with self.stage('splice'):
+                mp3_frames.splice_silence(input_file, output_file, options.silence_start,
+                                          options.silence_end, options.preserve_meta)
+        except mp3_frames.Mp3FormatError as e:
+            if self.tools.find('ffmpeg').available:
+                return self._stream_copy_file(input_file, output_file, options, info, on_progress)
+            self._set_failure('corrupt_input', str(e))
+            self.notify("warning", f"No se pudo empalmar {os.path.basename(input_file)}: {e}")
+            return False
+        
+        if on_progress:
+            on_progress(info.duration + options.silence_start + options.silence_end, None)
+        return True
+    
+    def _stream_copy_file(self, input_file: str, output_file: str,
+                          options: ProcessingOptions, info: ProbeInfo, on_progress=None) -> bool:
+        """Añadir silencio sin recodificar el audio original
+        
+        Solo se codifica el silencio, con la misma frecuencia, canales y
+        bitrate que el original (y se reutiliza desde ``silence_cache``).
+        Después se concatenan las tramas con ``-c copy`` y se corrigen el
+        retardo y el relleno de la etiqueta LAME (ver ``_joined_gapless``).
+        Si las tramas del silencio no se pueden unir a las del original, el
+        archivo se recodifica.
+        """
+        name = os.path.basename(input_file)
+        
+        with self.scratch(options) as temp_dir:
+            try:
+                args = self._stream_copy_args(input_file, output_file, options, info, temp_dir)
+            except mp3_frames.Mp3FormatError:
+                args = False
+            if args:
+                inputs, outputs, gapless = args
+                cmd = [self.tools.path('ffmpeg')] + inputs + outputs + ['-y']
+                
+                with self.stage('concat' if inputs.count('-i') > 1 else 'copy'):
+                    returncode = self._run_ffmpeg(cmd, on_progress)
+                if returncode != 0:
+                    if not self.cancel_event.is_set():
+                        self.notify("warning", f"Error al copiar {name}{self.failure_suffix()}")
+                    return False
+                self._apply_gapless(output_file, gapless)
+                return True
+        
+        if args is None:
+            return False
+        return self._encode_file(input_file, output_file, options, on_progress)
+    
+    def _stream_copy_args(self, input_file: str, output_file: str, options: ProcessingOptions,
+                          info: ProbeInfo, temp_dir: str,
+                          index: int = 0) -> Optional[Tuple[List[str], List[str], Optional[Tuple[int, int]]]]:
+        """Entradas y opciones de FFmpeg para copiar un archivo con su silencio
+        
+        ``index`` es el número de la primera entrada que tendrá este archivo
+        en el comando. Además de las entradas y las opciones de salida
+        devuelve el retardo y el relleno LAME que hay que escribir después
+        en la salida (o None). Devuelve None si no se pudo crear el silencio
+        y lanza ``Mp3FormatError`` si sus tramas no se pueden unir a las del
+        original sin recodificar (ver ``_check_silence``).
+        """
+        name = os.path.basename(input_file)
+        stream = mp3_frames.scan_file(input_file)
+        parts = []
+        silence_timer = time.perf_counter()
+        for label, duration in (("start", options.silence_start), ("end", options.silence_end)):
+            if duration <= 0:
+                continue
+            if self.silence_cache:
+                silence_file = self.silence_cache.get(
+                    info.sample_rate, info.channels, 0 if info.vbr else info.bit_rate, duration,
+                    lambda path, duration=duration: self.encode_silence(path, duration, info))
+            else:
+                silence_file = os.path.join(temp_dir, f"silence_{index}_{label}.mp3")
+                silence_size = int(duration * (info.bit_rate or 320000) / 8)
+                if not has_free_space(temp_dir, silence_size) or \
+                        not self.encode_silence(silence_file, duration, info):
+                    silence_file = None
+            if not silence_file:
+                if not self.cancel_event.is_set():
+                    self.notify("warning", f"Error al crear silencio para {name}{self.failure_suffix()}")
+                return None
+            self._check_silence(silence_file, stream)
+            parts.append((label, silence_file))
+        if parts and self.timings:
+            self.timings.record('silence', silence_timer)
+        
+        if parts:
+            # Lista para el demuxer concat: silencio inicial, original, silencio final
+            sources = [f for label, f in parts if label == "start"] + [input_file] + \
+                      [f for label, f in parts if label == "end"]
+            list_file = os.path.join(temp_dir, f"concat_{index}.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for source in sources:
+                    escaped = os.path.abspath(source).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            inputs = ['-f', 'concat', '-safe', '0', '-i', list_file, '-i', input_file]
+            meta_input = str(index + 1)
+        else:
+            # Sin silencio: basta con copiar el flujo
+            inputs = ['-i', input_file]
+            meta_input = str(index)
+        outputs = ['-map', f'{index}:a']
+        
+        if options.preserve_meta:
+            # Metadatos y carátula del archivo original
+            outputs.extend(['-map', f'{meta_input}:v?', '-map_metadata', meta_input,
+                            '-id3v2_version', '3'])
+        else:
+            outputs.extend(['-map_metadata', '-1'])
+        
+        outputs.extend(['-c', 'copy', '-f', 'mp3', output_file])
+        return inputs, outputs, self._joined_gapless(stream, parts, options) if parts else None
+    
+    def _check_silence(self, silence_file: str, source: mp3_frames.StreamInfo):
+        """Comprobar que las tramas de un silencio se pueden unir a las del original
+        
+        ``-c copy`` no cambia las tramas: un silencio con otra frecuencia,
+        otros canales o (en un CBR) otro bitrate daría un flujo mezclado bajo
+        la cabecera del original. En ese caso lanza ``Mp3FormatError``.
+        """
+        silence = mp3_frames.scan_file(silence_file)
+        if (silence.version, silence.sample_rate, silence.channels) != \
+                (source.version, source.sample_rate, source.channels) or \
+                (not source.vbr and silence.bit_rate != source.bit_rate):
+            raise mp3_frames.Mp3FormatError(
+                f"El silencio ({silence.bit_rate // 1000} kbps) no coincide con las tramas del original "
+                f"({source.bit_rate // 1000} kbps)")
+    
+    def _joined_gapless(self, source: mp3_frames.StreamInfo, parts: List[Tuple[str, str]],
+                        options: ProcessingOptions) -> Optional[Tuple[int, int]]:
+        """Retardo y relleno LAME de la salida concatenada (None si no se pueden calcular)
+        
+        El demuxer concat une las tramas tal cual: el retardo y el relleno
+        con los que LAME codificó cada silencio quedan como audio, y la
+        etiqueta que escribe el muxer no los descuenta. Contando las tramas
+        de cada silencio se calculan los valores con los que suena
+        exactamente el silencio pedido, como en ``mp3_frames.splice_silence``.
+        """
+        try:
+            frames = {label: mp3_frames.count_frames(path) for label, path in parts}
+        except (mp3_frames.Mp3FormatError, OSError):
+            return None
+        
+        rate = source.sample_rate
+        delay, padding = mp3_frames.gapless_fields(
+            source, frames.get("start", 0), frames.get("end", 0),
+            int(round(options.silence_start * rate)), int(round(options.silence_end * rate)))
+        # Sin silencio inicial, un original sin etiqueta no tiene retardo que descontar
+        return max(delay, 0), padding
+    
+    def _apply_gapless(self, output_file: str, gapless: Optional[Tuple[int, int]]):
+        """Escribir en la salida el retardo y el relleno de ``_joined_gapless``"""
+        if not gapless:
+            return
+        try:
+            mp3_frames.set_gapless(output_file, *gapless)
+        except (mp3_frames.Mp3FormatError, OSError) as e:
+            self.notify("warning", f"No se pudo ajustar la duración de {os.path.basename(output_file)}: {e}")
+    
+    def encode_silence(self, silence_file: str, duration: float, info: ProbeInfo) -> bool:
+        """Codificar silencio compatible con las tramas de un archivo"""
+        ffmpeg_cmd = self.tools.path('ffmpeg')
+        layout = 'mono' if info.channels == 1 else 'stereo'
+        
+        cmd = [ffmpeg_cmd, '-f', 'lavfi',
+               '-i', f'anullsrc=channel_layout={layout}:sample_rate={info.sample_rate}',
+               '-t', f'{duration:.3f}', '-c:a', 'libmp3lame']
+        
+        if info.vbr:
+            cmd.extend(['-q:a', '9'])
+        else:
+            cmd.extend(['-b:a', f"{round(info.bit_rate / 1000)}k"])
+        
+        # Solo tramas de audio: sin etiquetas ni cabecera Xing propias
+        cmd.extend(['-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', silence_file, '-y'])
+        return self._run_ffmpeg(cmd) == 0
+    
+    def build_silence_filter(self, silence_start: float, silence_end: float) -> str:
+        """Construir el filtro de audio que añade silencio al inicio y al final"""
+        filters = []
+        
+        if silence_start > 0:
+            # adelay desplaza todos los canales rellenando con silencio
+            delay_ms = int(round(silence_start * 1000))
+            filters.append(f'adelay=delays={delay_ms}:all=1')
+        
+        if silence_end > 0:
+            # apad añade exactamente la duración indicada tras el final
+            filters.append(f'apad=pad_dur={silence_end:.3f}')
+        
+        return ','.join(filters)
+    
+    def get_original_bitrate(self, input_file):
+        """Obtener el bitrate original de un archivo MP3"""
+        info = self.probe_cache.get(input_file)
+        if info:
+            return info.bit_rate or 128000
+        return None
+    
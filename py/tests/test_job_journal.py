@@ -0,0 +1,135 @@
+"""Pruebas del registro de trabajos: reanudar lotes y omitir entradas sin cambios
+
+Los lotes se procesan con el empalme de tramas (sin FFmpeg) sobre flujos
+MPEG-1 Layer III sintéticos.
+"""
+import os
+
+import pytest
+
+from mp3_core import JobJournal, MP3Processor, ProbeCache, ProcessingOptions
+
+
+FRAME = bytes.fromhex('fffb9000') + bytes(413)  # 128 kbps, 44,1 kHz, estéreo
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.db"))
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    folder = tmp_path / "entrada"
+    folder.mkdir()
+    paths = []
+    for n, frames in enumerate((10, 20, 30)):
+        path = folder / f"pista{n}.mp3"
+        path.write_bytes(FRAME * frames)
+        paths.append(str(path))
+    return paths
+
+
+def options_for(tmp_path, **changes):
+    output = tmp_path / "salida"
+    output.mkdir(exist_ok=True)
+    settings = dict(silence_start=0.5, silence_end=0.5, output_folder=str(output))
+    settings.update(changes)
+    return ProcessingOptions(**settings)
+
+
+def run(files, options, journal, resume=False):
+    processor = MP3Processor(ProbeCache())
+    return processor.run_batch(files, options, journal=journal, resume=resume)
+
+
+def test_resume_skips_finished_jobs_and_keeps_output_paths(tmp_path, journal, inputs):
+    options = options_for(tmp_path)
+    first = run(inputs, options, journal)
+    assert all(result.success and not result.skipped for result in first)
+    batch_id = JobJournal.batch_id(inputs, options)
+    assert journal.progress(batch_id) == (3, 3)
+    
+    # Simular una interrupción: el segundo trabajo no llegó a terminar
+    journal.mark(batch_id, 1, "pending")
+    os.remove(first[1].output_file)
+    mtimes = [os.stat(result.output_file).st_mtime_ns for result in (first[0], first[2])]
+    
+    resumed = run(inputs, options, journal, resume=True)
+    assert [result.skipped for result in resumed] == [True, False, True]
+    assert all(result.success for result in resumed)
+    # Se reutiliza la ruta asignada (sin sufijos _1) y no se toca lo terminado
+    assert [result.output_file for result in resumed] == [result.output_file for result in first]
+    assert [os.stat(result.output_file).st_mtime_ns for result in (resumed[0], resumed[2])] == mtimes
+    assert journal.progress(batch_id) == (3, 3)
+
+
+def test_resume_redoes_jobs_whose_input_changed(tmp_path, journal, inputs):
+    options = options_for(tmp_path)
+    first = run(inputs, options, journal)
+    with open(inputs[0], 'ab') as f:
+        f.write(FRAME)
+    
+    resumed = run(inputs, options, journal, resume=True)
+    assert [result.skipped for result in resumed] == [False, True, True]
+    assert resumed[0].output_file == first[0].output_file
+
+
+def test_without_resume_a_batch_runs_again(tmp_path, journal, inputs):
+    options = options_for(tmp_path)
+    first = run(inputs, options, journal)
+    again = run(inputs, options, journal)
+    assert not any(result.skipped for result in again)
+    # Sin reanudar ni sobrescribir, las salidas existentes no se pisan
+    assert all(a.output_file != b.output_file for a, b in zip(first, again))
+
+
+def test_other_settings_are_another_batch(tmp_path, journal, inputs):
+    options = options_for(tmp_path)
+    other = options_for(tmp_path, silence_end=1.0)
+    assert JobJournal.batch_id(inputs, options) != JobJournal.batch_id(inputs, other)
+    # Las opciones de ejecución no cambian el lote
+    assert JobJournal.batch_id(inputs, options) == \
+        JobJournal.batch_id(inputs, options_for(tmp_path, max_workers=8, fsync=True))
+
+
+def test_skip_unchanged(tmp_path, journal, inputs):
+    options = options_for(tmp_path, skip_unchanged=True)
+    first = run(inputs, options, journal)
+    assert not any(result.skipped for result in first)
+    
+    second = run(inputs, options, journal)
+    assert all(result.skipped and result.success for result in second)
+    assert [result.output_file for result in second] == [result.output_file for result in first]
+    
+    # Mismo contenido con otra fecha: sigue al día
+    stat = os.stat(inputs[0])
+    os.utime(inputs[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    # Otro contenido: se vuelve a generar en la misma ruta
+    with open(inputs[1], 'r+b') as f:
+        f.seek(100)
+        f.write(b'\x55')
+    # Salida borrada: se vuelve a generar
+    os.remove(first[2].output_file)
+    
+    third = run(inputs, options, journal)
+    assert [result.skipped for result in third] == [True, False, False]
+    assert [result.output_file for result in third] == [result.output_file for result in first]
+    
+    # Con otra configuración no vale ninguna salida anterior
+    changed = run(inputs, options_for(tmp_path, skip_unchanged=True, silence_start=1.0), journal)
+    assert not any(result.skipped for result in changed)
+
+
+def test_skip_unchanged_ignores_modified_outputs(tmp_path, journal, inputs):
+    options = options_for(tmp_path, skip_unchanged=True)
+    first = run(inputs, options, journal)
+    with open(first[0].output_file, 'ab') as f:
+        f.write(b'editado a mano')
+    
+    second = run(inputs, options, journal)
+    assert [result.skipped for result in second] == [False, True, True]
+    # La salida modificada no es nuestra: no se sobrescribe
+    assert second[0].output_file != first[0].output_file
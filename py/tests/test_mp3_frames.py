@@ -0,0 +1,222 @@
+"""Pruebas del empalme de tramas (``mp3_frames.splice_silence``)
+
+Las pruebas con archivos reales generan los MP3 con FFmpeg (se omiten si no
+está disponible) y comprueban la salida tanto por su estructura (tramas,
+etiqueta Xing/LAME, CRC) como decodificándola.
+"""
+import os
+import subprocess
+
+import pytest
+
+import mp3_frames
+from mp3_core import TOOLS
+
+
+SILENCE_START = 0.25
+SILENCE_END = 0.4
+
+
+def ffmpeg_path():
+    ffmpeg = TOOLS.find('ffmpeg')
+    if not ffmpeg.available or not ffmpeg.has_libmp3lame:
+        pytest.skip("FFmpeg con libmp3lame no disponible")
+    return ffmpeg.path
+
+
+def make_fixture(path, sample_rate, channels, vbr, seconds=2.0, bitrate=64):
+    """Codificar un tono con LAME (CBR a ``bitrate`` kbps o VBR de calidad 4)"""
+    cmd = [ffmpeg_path(), '-v', 'error', '-f', 'lavfi', '-i', f'sine=f=440:d={seconds}',
+           '-ar', str(sample_rate), '-ac', str(channels), '-c:a', 'libmp3lame']
+    cmd += ['-q:a', '4'] if vbr else ['-b:a', f'{bitrate}k']
+    subprocess.run(cmd + ['-metadata', 'title=Prueba', '-f', 'mp3', path, '-y'], check=True)
+
+
+def decoded_samples(path):
+    """Muestras por canal que devuelve FFmpeg (que respeta el retardo y el relleno LAME)"""
+    out = subprocess.run([ffmpeg_path(), '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-'],
+                         capture_output=True, check=True).stdout
+    return len(out) // 2, out
+
+
+def read_output(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# --- CRC -------------------------------------------------------------------
+
+def test_crc16_check_value():
+    assert mp3_frames.crc16(b'123456789') == 0xBB3D
+
+
+def test_crc16_combine_matches_direct_crc():
+    a, b = os.urandom(1000), os.urandom(333)
+    combined = mp3_frames.crc16_combine(mp3_frames.crc16(a), mp3_frames.crc16(b), len(b))
+    assert combined == mp3_frames.crc16(a + b)
+    assert mp3_frames.crc16_combine(mp3_frames.crc16(a), 0, 0) == mp3_frames.crc16(a)
+
+
+def test_crc16_repeat():
+    block = os.urandom(417)
+    for count in (0, 1, 2, 7, 64):
+        assert mp3_frames._crc16_repeat(mp3_frames.crc16(block), len(block), count) == \
+            mp3_frames.crc16(block * count)
+
+
+# --- Tramas de silencio y depósito de bits ---------------------------------
+
+def test_silent_run_places_reservoir_at_the_end():
+    frame = bytes.fromhex('fffb9000') + bytes(413)
+    reservoir = os.urandom(500)  # No cabe en una sola trama (381 bytes libres)
+    frames = mp3_frames._silent_run(frame, 3, reservoir, 36)
+    assert len(frames) == 3 and all(len(f) == len(frame) and f[:36] == frame[:36] for f in frames)
+    assert b''.join(f[36:] for f in frames).endswith(reservoir)
+    assert frames[0] is frame
+
+
+def synthetic_stream(frames, main_data_begin=0):
+    """Flujo MPEG-1 Layer III sin etiquetas de tramas a cero (128 kbps, estéreo)"""
+    frame = bytearray(bytes.fromhex('fffb9000') + bytes(413))
+    first = bytearray(frame)
+    first[4] = main_data_begin >> 1
+    first[5] = (main_data_begin & 1) << 7
+    return bytes(first) + bytes(frame) * (frames - 1)
+
+
+def test_reservoir_is_copied_in_front_of_the_first_frame(tmp_path):
+    # Un archivo con trama Info cuya primera trama de audio toma 300 bytes
+    # del final de la trama Info (depósito de bits)
+    plain = tmp_path / "plain.mp3"
+    plain.write_bytes(synthetic_stream(20))
+    tagged = tmp_path / "tagged.mp3"
+    mp3_frames.splice_silence(str(plain), str(tagged), 0, 0)
+    
+    data = bytearray(tagged.read_bytes())
+    info = mp3_frames.analyze(data)
+    pattern = os.urandom(300)
+    data[info.audio_start - 300:info.audio_start] = pattern
+    data[info.audio_start + 4] = 300 >> 1
+    data[info.audio_start + 5] = (300 & 1) << 7
+    tagged.write_bytes(bytes(data))
+    
+    for start in (0.0, 0.05, 0.5):
+        output = tmp_path / f"out_{start}.mp3"
+        layout = mp3_frames.splice_silence(str(tagged), str(output), start, 0)
+        result = output.read_bytes()
+        # Zonas de datos de las tramas anteriores a la primera original
+        areas = bytearray(layout.xing[36:])
+        for frame in layout.before:
+            areas += frame[36:]
+        assert bytes(areas).endswith(pattern)
+        body = len(layout.xing) + sum(map(len, layout.before))
+        assert mp3_frames.main_data_begin(result, body, mp3_frames.parse_header(result, body)) == 300
+
+
+def test_synthetic_stream_without_tag(tmp_path):
+    source = tmp_path / "plain.mp3"
+    source.write_bytes(synthetic_stream(10))
+    output = tmp_path / "out.mp3"
+    layout = mp3_frames.splice_silence(str(source), str(output), 0.1, 0.1)
+    
+    info = mp3_frames.scan_file(str(output))
+    assert info.tag_type == 'Info'
+    assert info.frames == layout.frames == len(layout.before) + 10 + len(layout.after)
+    # Sin etiqueta, el original sonaba entero: 10 tramas más el silencio
+    assert round(info.duration * 44100) == 10 * 1152 + round(0.1 * 44100) * 2
+
+
+def test_rejects_other_layers(tmp_path):
+    source = tmp_path / "layer2.mp2"
+    frame = bytes.fromhex('fffd9000') + bytes(413)  # MPEG-1 Layer II
+    source.write_bytes(frame * 10)
+    with pytest.raises(mp3_frames.Mp3FormatError):
+        mp3_frames.splice_silence(str(source), str(tmp_path / "out.mp3"), 1, 1)
+
+
+# --- Archivos codificados con LAME -----------------------------------------
+
+FIXTURES = [
+    (44100, 2, False, 64), (44100, 1, True, 0), (44100, 2, False, 32),   # MPEG-1
+    (22050, 1, False, 64), (24000, 2, True, 0), (22050, 1, False, 16),   # MPEG-2
+    (11025, 2, False, 64), (8000, 1, True, 0), (8000, 1, False, 8),      # MPEG-2.5
+]
+
+
+@pytest.mark.parametrize("sample_rate,channels,vbr,bitrate", FIXTURES)
+def test_splice_lame_file(tmp_path, sample_rate, channels, vbr, bitrate):
+    source = str(tmp_path / "source.mp3")
+    output = str(tmp_path / "output.mp3")
+    make_fixture(source, sample_rate, channels, vbr, bitrate=bitrate)
+    layout = mp3_frames.splice_silence(source, output, SILENCE_START, SILENCE_END)
+    data = read_output(output)
+    original = mp3_frames.scan_file(source)
+    info = mp3_frames.analyze(data)
+    
+    # Estructura: etiquetas, número de tramas y tamaño
+    assert len(data) == layout.size
+    assert info.tag_type == ('Xing' if vbr else 'Info')
+    assert info.tags.get('title') == 'Prueba'
+    assert info.version == original.version and info.channels == channels
+    frames = list(mp3_frames.iter_frames(data, info.audio_start, info.audio_end))
+    assert info.frames == layout.frames == len(frames) == \
+        len(layout.before) + original.frames + len(layout.after)
+    assert info.audio_start + sum(header.length for _, header in frames) == info.audio_end
+    if not vbr:
+        # Las tramas de silencio usan el bitrate del audio, no el de la trama Info
+        assert {header.bitrate for _, header in frames} == {bitrate * 1000}
+        assert info.bit_rate == original.bit_rate == bitrate * 1000
+    
+    # Etiqueta LAME: retardo, relleno, longitud y CRC
+    xing_pos = len(layout.head)
+    header = mp3_frames.parse_header(data, xing_pos)
+    lame = mp3_frames.lame_tag_offset(data, xing_pos, header, info.audio_start)
+    assert lame is not None
+    assert (info.encoder_delay, info.encoder_padding) == (layout.encoder_delay, layout.encoder_padding)
+    music_length = int.from_bytes(data[lame + 28:lame + 32], 'big')
+    assert music_length == info.audio_end - xing_pos
+    assert int.from_bytes(data[lame + 32:lame + 34], 'big') == \
+        mp3_frames.crc16(data[info.audio_start:info.audio_end])
+    frame = bytearray(data[xing_pos:info.audio_start])
+    frame[lame - xing_pos + 34:lame - xing_pos + 36] = b'\x00\x00'
+    assert int.from_bytes(data[lame + 34:lame + 36], 'big') == \
+        mp3_frames.crc16(frame[:mp3_frames.LAME_TAG_CRC_SPAN])
+    
+    # Duración exacta según la etiqueta y según el decodificador
+    start = round(SILENCE_START * sample_rate)
+    end = round(SILENCE_END * sample_rate)
+    assert round(info.duration * sample_rate) == round(original.duration * sample_rate) + start + end
+    source_count, source_pcm = decoded_samples(source)
+    output_count, output_pcm = decoded_samples(output)
+    assert output_count == source_count + start + end
+    # El audio original no cambia: se copian sus tramas tal cual
+    assert output_pcm[start * 2:(start + source_count) * 2] == source_pcm
+
+
+@pytest.mark.parametrize("sample_rate,channels,bitrate", [(44100, 2, 32), (22050, 1, 16), (8000, 1, 8)])
+def test_cbr_bitrate_comes_from_audio_frames(tmp_path, sample_rate, channels, bitrate):
+    # LAME sube el bitrate de la trama Info para que quepa la etiqueta
+    path = str(tmp_path / "source.mp3")
+    make_fixture(path, sample_rate, channels, False, bitrate=bitrate)
+    info = mp3_frames.scan_file(path)
+    assert info.tag_type == 'Info' and not info.vbr
+    assert info.first_header.bitrate > bitrate * 1000
+    assert info.bit_rate == bitrate * 1000
+
+
+def test_set_gapless_rewrites_fields_and_crc(tmp_path):
+    path = str(tmp_path / "source.mp3")
+    make_fixture(path, 44100, 2, False)
+    mp3_frames.set_gapless(path, 1234, 2345)
+    data = read_output(path)
+    info = mp3_frames.analyze(data)
+    assert (info.encoder_delay, info.encoder_padding) == (1234, 2345)
+    
+    xing_pos = info.audio_start - info.first_header.length
+    lame = mp3_frames.lame_tag_offset(data, xing_pos, info.first_header, info.audio_start)
+    frame = bytearray(data[xing_pos:info.audio_start])
+    frame[lame - xing_pos + 34:lame - xing_pos + 36] = b'\x00\x00'
+    assert int.from_bytes(data[lame + 34:lame + 36], 'big') == \
+        mp3_frames.crc16(frame[:mp3_frames.LAME_TAG_CRC_SPAN])
+    with pytest.raises(mp3_frames.Mp3FormatError):
+        mp3_frames.set_gapless(path, 5000, 0)
@@ -0,0 +1,125 @@
+"""Pruebas del recorrido de carpetas (``scan_directory`` y ``ScanFilter``)"""
+import os
+import threading
+
+import pytest
+
+from mp3_core import ScanFilter, iter_sources, match_path_glob, scan_directory
+
+
+def make_tree(root, files):
+    """Crear ``files`` (ruta relativa -> tamaño en bytes) bajo ``root``"""
+    for relative, size in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes(size))
+
+
+def scanned(root, **options):
+    """Rutas relativas (con ``/``) que devuelve el recorrido, en orden"""
+    return [os.path.relpath(path, root).replace(os.sep, '/')
+            for path, _ in scan_directory(str(root), ScanFilter(**options))]
+
+
+TREE = {
+    'a.mp3': 10,
+    'b.MP3': 20,
+    'notas.txt': 5,
+    'directo/c.mp3': 30,
+    'directo/ensayo/d.mp3': 40,
+    'directo/ensayo/toma/e.mp3': 50,
+    'tmp/f.mp3': 60,
+}
+
+
+def test_walks_the_tree_in_order(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert scanned(tmp_path) == ['a.mp3', 'b.MP3', 'directo/c.mp3', 'directo/ensayo/d.mp3',
+                                 'directo/ensayo/toma/e.mp3', 'tmp/f.mp3']
+
+
+def test_reports_sizes(tmp_path):
+    make_tree(tmp_path, TREE)
+    sizes = {os.path.basename(path): size for path, size in scan_directory(str(tmp_path))}
+    assert sizes['a.mp3'] == 10 and sizes['f.mp3'] == 60
+
+
+def test_name_patterns_ignore_case_and_folders(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert scanned(tmp_path, include=('[ab].mp3',)) == ['a.mp3', 'b.MP3']
+    assert scanned(tmp_path, include=('E.MP3',)) == ['directo/ensayo/toma/e.mp3']
+
+
+def test_path_patterns_do_not_cross_folders(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert scanned(tmp_path, include=('directo/*',)) == ['directo/c.mp3']
+    assert scanned(tmp_path, include=('directo/*/*.mp3',)) == ['directo/ensayo/d.mp3']
+    assert scanned(tmp_path, include=('directo/**',)) == \
+        ['directo/c.mp3', 'directo/ensayo/d.mp3', 'directo/ensayo/toma/e.mp3']
+    assert scanned(tmp_path, include=('**/toma/*.mp3',)) == ['directo/ensayo/toma/e.mp3']
+
+
+def test_exclude_prunes_folders(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert scanned(tmp_path, exclude=('tmp',)) == \
+        ['a.mp3', 'b.MP3', 'directo/c.mp3', 'directo/ensayo/d.mp3', 'directo/ensayo/toma/e.mp3']
+    assert scanned(tmp_path, exclude=('directo/ensayo',)) == ['a.mp3', 'b.MP3', 'directo/c.mp3', 'tmp/f.mp3']
+    assert scanned(tmp_path, exclude=('B.mp3', 'directo/**')) == ['a.mp3', 'tmp/f.mp3']
+
+
+def test_size_and_depth_limits(tmp_path):
+    make_tree(tmp_path, TREE)
+    assert scanned(tmp_path, min_size=30, max_size=50) == \
+        ['directo/c.mp3', 'directo/ensayo/d.mp3', 'directo/ensayo/toma/e.mp3']
+    assert scanned(tmp_path, max_depth=0) == ['a.mp3', 'b.MP3']
+    assert scanned(tmp_path, max_depth=1) == ['a.mp3', 'b.MP3', 'directo/c.mp3', 'tmp/f.mp3']
+
+
+@pytest.mark.parametrize("parts,pattern,expected", [
+    ('a/b.mp3', 'a/*', True),
+    ('a/x/b.mp3', 'a/*', False),
+    ('a/b.mp3', 'a/**', True),
+    ('a/b.mp3', '**/b.mp3', True),
+    ('b.mp3', '**/b.mp3', True),
+    ('a/x/y/b.mp3', 'a/**/y/*.mp3', True),
+    ('a/x/y/b.mp3', 'a/**/x/*.mp3', False),
+])
+def test_match_path_glob(parts, pattern, expected):
+    assert match_path_glob(parts.split('/'), pattern.split('/')) is expected
+
+
+def symlink(target, link):
+    try:
+        os.symlink(target, link, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip("No se pueden crear enlaces simbólicos")
+
+
+def test_symlink_loops_are_visited_once(tmp_path):
+    make_tree(tmp_path, {'música/a.mp3': 1, 'música/disco/b.mp3': 1})
+    symlink(tmp_path / 'música', tmp_path / 'música' / 'disco' / 'bucle')
+    symlink(tmp_path / 'música' / 'disco', tmp_path / 'música' / 'atajo')
+    
+    # Sin seguir enlaces no se entra en ellos
+    assert scanned(tmp_path) == ['música/a.mp3', 'música/disco/b.mp3']
+    
+    # Siguiéndolos, cada carpeta real se recorre una sola vez
+    found = scanned(tmp_path, follow_symlinks=True)
+    assert sorted(os.path.basename(path) for path in found) == ['a.mp3', 'b.mp3']
+
+
+def test_cancel_stops_the_scan(tmp_path):
+    make_tree(tmp_path, {f'{n:02d}/a.mp3': 1 for n in range(20)})
+    cancel = threading.Event()
+    found = []
+    for path, _ in scan_directory(str(tmp_path), cancel=cancel):
+        found.append(path)
+        cancel.set()
+    assert len(found) == 1
+
+
+def test_iter_sources_mixes_files_and_folders(tmp_path):
+    make_tree(tmp_path, {'suelto.mp3': 1, 'otro.wav': 1, 'carpeta/a.mp3': 1})
+    sources = [str(tmp_path / 'suelto.mp3'), str(tmp_path / 'otro.wav'),
+               str(tmp_path / 'carpeta'), str(tmp_path / 'no_existe.mp3')]
+    assert [os.path.basename(path) for path, _ in iter_sources(sources)] == ['suelto.mp3', 'a.mp3']
@@ -0,0 +1,188 @@
+"""Pruebas del cálculo de tamaños: tamaño exacto y estimación de toda la lista
+
+La estimación vectorizada (NumPy) de ``SizePlanner`` debe dar lo mismo que
+``estimate_output_bytes`` fila a fila. Las pruebas de tamaño exacto de
+extremo a extremo codifican con FFmpeg (se omiten si no está disponible).
+"""
+import os
+import random
+import subprocess
+
+import pytest
+
+import mp3_core
+import mp3_frames
+from mp3_core import (MP3Processor, ProbeCache, ProbeInfo, ProcessingOptions, SizePlanner, TOOLS,
+                      estimate_output_bytes, plan_target_bitrate, split_target_total)
+
+
+# --- Bitrate para un tamaño exacto -----------------------------------------
+
+@pytest.mark.parametrize("duration,sample_rate,channels", [
+    (1.0, 44100, 2), (61.3, 44100, 1), (600.0, 48000, 2), (12.5, 22050, 1), (3.0, 8000, 1),
+])
+def test_plan_target_bitrate_is_the_largest_that_fits(duration, sample_rate, channels):
+    version = mp3_frames.mpeg_version(sample_rate)
+    rates = mp3_frames.layer3_bitrates(version)
+    for target in (10000, 50000, 200000, 1000000, 5000000):
+        bitrate = plan_target_bitrate(duration, sample_rate, channels, target, tag_bytes=100)
+        sizes = {rate: mp3_frames.estimate_cbr_size(duration, sample_rate, rate, channels, 100)
+                 for rate in rates}
+        fitting = [rate for rate in rates if sizes[rate] <= target]
+        assert bitrate == (max(fitting) if fitting else None)
+
+
+def test_plan_target_bitrate_below():
+    target = mp3_frames.estimate_cbr_size(10.0, 44100, 192000)
+    assert plan_target_bitrate(10.0, 44100, 2, target) == 192000
+    assert plan_target_bitrate(10.0, 44100, 2, target, below=192000) == 160000
+    assert plan_target_bitrate(10.0, 44100, 2, 100) is None
+
+
+def test_estimate_cbr_size_counts_lame_frames():
+    # 1 s a 44,1 kHz: 44100 + 576 + 529 muestras -> 40 tramas de 1152
+    assert mp3_frames.encoded_frame_count(44100, '1') == 40
+    per_frame = 144 * 128000 / 44100
+    xing = mp3_frames.xing_frame_length('1', 128000, 44100, 2)
+    assert mp3_frames.estimate_cbr_size(1.0, 44100, 128000, 2, 10) == 10 + xing + round(40 * per_frame)
+
+
+def info(duration, tag_bytes=0, **fields):
+    defaults = dict(path="x.mp3", size=int(duration * 16000) + tag_bytes, mtime_ns=0, duration=duration,
+                    bit_rate=128000, sample_rate=44100, channels=2, tag_bytes=tag_bytes, source='frames')
+    defaults.update(fields)
+    return ProbeInfo(**defaults)
+
+
+def test_split_target_total_is_exact_and_proportional():
+    infos = [info(10.0, 1000), info(30.0, 0), None, info(60.0, 5000)]
+    shares = split_target_total(infos, 10000000, 1.0)
+    assert sum(shares) == 10000000
+    budget = 10000000 - 6000
+    assert shares[0] == 1000 + int(budget * 11 / 104)
+    assert shares[1] == int(budget * 31 / 104)
+    assert shares[2] == int(budget * 1 / 104)
+    assert split_target_total([], 1000, 0.0) == []
+
+
+# --- SizePlanner: NumPy frente al cálculo fila a fila ----------------------
+
+def random_infos(count, seed=1):
+    rng = random.Random(seed)
+    infos = []
+    for n in range(count):
+        duration = rng.choice([0.0, 0.4, 1.0, 59.99, 61.2, 3600.0, rng.uniform(0.1, 900)])
+        infos.append(info(
+            duration, tag_bytes=rng.choice([0, 128, 4096, 300000]),
+            path=f"/musica/{n}.mp3",
+            bit_rate=rng.choice([0, 8000, 32000, 96000, 128000, 191873, 320000]),
+            sample_rate=rng.choice([8000, 11025, 22050, 24000, 32000, 44100, 48000, 96000, 0]),
+            channels=rng.choice([1, 2, 6]),
+            source=rng.choice(['frames', 'ffprobe'])))
+    # Filas sin metadatos
+    infos[3] = None
+    infos[17] = None
+    return infos
+
+
+def planner_for(infos):
+    planner = SizePlanner()
+    for n, row in enumerate(infos):
+        planner.add(row.path if row else f"/musica/sin_datos_{n}.mp3", 12345, row)
+    return planner
+
+
+OPTIONS = [
+    dict(bitrate="original"),
+    dict(bitrate="original", stream_copy=False),
+    dict(bitrate="original", silence_start=2.5, silence_end=0.75),
+    dict(bitrate="128k", silence_start=1.0),
+    dict(bitrate="32k"),
+    dict(bitrate="320k", silence_end=10.0),
+    dict(bitrate="vbr", silence_start=0.5, silence_end=0.5),
+    dict(target_size=3000000),
+    dict(target_total=750000000, silence_start=1.0),
+]
+
+
+@pytest.mark.parametrize("changes", OPTIONS)
+def test_numpy_planner_matches_scalar_estimate(monkeypatch, changes):
+    pytest.importorskip("numpy")
+    infos = random_infos(400)
+    options = ProcessingOptions(**changes)
+    planner = planner_for(infos)
+    
+    vectorized = planner.estimate(options)
+    monkeypatch.setattr(mp3_core, 'NUMPY_AVAILABLE', False)
+    scalar = planner.estimate(options)
+    
+    assert vectorized.estimated == scalar.estimated
+    assert vectorized.total_original == scalar.total_original
+    assert vectorized.total_estimated == scalar.total_estimated
+    assert vectorized.known == scalar.known
+    assert vectorized.total_duration == pytest.approx(scalar.total_duration)
+    
+    if not options.target_total:
+        # El cálculo fila a fila es el mismo que se usa al procesar
+        for row, estimated in zip(infos, scalar.estimated):
+            expected = estimate_output_bytes(row, options) if row and row.duration else -1
+            assert estimated == expected
+
+
+def test_planner_updates_rows():
+    planner = SizePlanner()
+    planner.add("/a.mp3", 100)
+    planner.add("/b.mp3", 200, info(10.0, path="/b.mp3"))
+    options = ProcessingOptions(bitrate="128k")
+    assert planner.estimate(options).estimated[0] == -1
+    
+    planner.add("/a.mp3", 100, info(20.0, path="/a.mp3"))
+    plan = planner.estimate(options)
+    assert len(planner) == 2 and plan.known == 2
+    assert plan.estimated == [estimate_output_bytes(info(20.0), options),
+                              estimate_output_bytes(info(10.0), options)]
+
+
+# --- Tamaño exacto de extremo a extremo ------------------------------------
+
+def ffmpeg_path():
+    ffmpeg = TOOLS.find('ffmpeg')
+    if not ffmpeg.available or not ffmpeg.has_libmp3lame:
+        pytest.skip("FFmpeg con libmp3lame no disponible")
+    return ffmpeg.path
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "tono.mp3"
+    subprocess.run([ffmpeg_path(), '-v', 'error', '-f', 'lavfi', '-i', 'sine=f=440:d=5',
+                    '-ac', '2', '-c:a', 'libmp3lame', '-b:a', '128k', '-metadata', 'title=Tono',
+                    str(path), '-y'], check=True)
+    return str(path)
+
+
+@pytest.mark.parametrize("target", [40000, 61234, 123457])
+def test_target_size_is_exact(tmp_path, source, target):
+    options = ProcessingOptions(silence_start=1.0, silence_end=0.5, target_size=target,
+                                output_folder=str(tmp_path))
+    result, = MP3Processor(ProbeCache()).run_batch([source], options)
+    assert result.success, result.error
+    with open(result.output_file, 'rb') as f:
+        data = f.read()
+    assert len(data) == target
+    # La salida sigue siendo un MP3 válido con la duración esperada
+    assert mp3_frames.analyze(data).duration == pytest.approx(6.5, abs=0.05)
+
+
+def test_target_total_splits_the_batch(tmp_path, source):
+    options = ProcessingOptions(target_total=150000, output_folder=str(tmp_path))
+    results = MP3Processor(ProbeCache()).run_batch([source, source], options)
+    assert all(result.success for result in results)
+    assert sum(os.path.getsize(result.output_file) for result in results) == 150000
+
+
+def test_target_too_small(tmp_path, source):
+    options = ProcessingOptions(target_size=2000, output_folder=str(tmp_path))
+    result, = MP3Processor(ProbeCache()).run_batch([source], options)
+    assert not result.success
+    assert result.error_class == 'target_too_small'